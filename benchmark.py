@@ -0,0 +1,310 @@
+#!/usr/bin/python3
+"""
+Copyright 2020 hammy3502
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+# Benchmarks for scrcpy-gui's launch paths, run against fake adb and scrcpy stand-ins (and a fake
+# adb server), so no device, display or real adb/scrcpy install is needed. Every run is appended
+# to .benchmarks/history.jsonl, and compared against the last run from a different commit.
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+from time import sleep, monotonic
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import main  # noqa: E402 (needs the path set up first)
+
+here = os.path.dirname(os.path.abspath(__file__))
+history_file = os.path.join(here, ".benchmarks", "history.jsonl")
+
+fake_adb = '''#!{python}
+import os, sys, time
+time.sleep(float(os.environ.get("FAKE_ADB_DELAY", "0")))
+args = sys.argv[1:]
+if args[:1] == ["connect"]:
+    print("connected to " + args[1])
+elif args[:1] == ["devices"]:
+    print("List of devices attached")
+    print("FAKE0001\\tdevice usb:1-1 product:fake model:Fake")
+'''
+
+fake_scrcpy = '''#!{python}
+import os, sys, time
+delay = float(os.environ.get("FAKE_SCRCPY_DELAY", "0"))
+print("INFO: scrcpy 1.14 <https://github.com/Genymobile/scrcpy>", flush=True)
+time.sleep(delay)
+print("INFO: Initial texture: 1080x2340", file=sys.stderr, flush=True)
+'''
+
+
+class FakeAdbServer(threading.Thread):
+    """Fake adb Server.
+
+    Answers the host protocol requests scrcpy-gui makes with one connected USB device, waiting
+    delay seconds before each answer.
+
+    """
+
+    def __init__(self, delay=0.0):
+        super().__init__(daemon=True)
+        self.delay = delay
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+
+    @staticmethod
+    def _read_request(conn):
+        size = int(conn.recv(4), 16)
+        data = b""
+        while len(data) < size:
+            data += conn.recv(size - len(data))
+        return data.decode()
+
+    @staticmethod
+    def _okay(conn, data):
+        data = data.encode()
+        conn.sendall(b"OKAY" + "{:04x}".format(len(data)).encode() + data)
+
+    def _handle(self, conn):
+        with conn:
+            request = self._read_request(conn)
+            sleep(self.delay)
+            if request == "host:version":
+                self._okay(conn, "0029")
+            elif request == "host:devices-l":
+                self._okay(conn, "FAKE0001\tdevice usb:1-1 product:fake model:Fake\n")
+            elif request.startswith("host:connect:"):
+                self._okay(conn, "connected to " + request[len("host:connect:"):])
+            elif request.startswith("host:transport"):
+                conn.sendall(b"OKAY")
+                service = self._read_request(conn)
+                conn.sendall(b"OKAY" + ("ran " + service).encode())
+            else:
+                conn.sendall(b"FAIL0007unknown")
+
+    def run(self):
+        while True:
+            conn, _ = self.sock.accept()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+def make_fakes(directory):
+    """Write Fake adb and scrcpy.
+
+    Args:
+        directory (str): Folder to write them to
+
+    """
+    for name, source in (("adb", fake_adb), ("scrcpy", fake_scrcpy)):
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write(source.format(python=sys.executable))
+        os.chmod(path, 0o755)
+
+
+def measure(func, runs):
+    """Time Function.
+
+    Args:
+        func (function): Function to time
+        runs (int): Times to run it
+
+    Returns:
+        list: Seconds each run took
+
+    """
+    times = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(runs):
+            start = monotonic()
+            func()
+            times.append(monotonic() - start)
+    return times
+
+
+def stats(times):
+    """Summarize Timings.
+
+    Args:
+        times (list): Seconds each run took
+
+    Returns:
+        dict: Minimum, median, 95th percentile and maximum, in milliseconds
+
+    """
+    ordered = sorted(times)
+    return {
+        "runs": len(ordered),
+        "min": ordered[0] * 1000,
+        "median": statistics.median(ordered) * 1000,
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max": ordered[-1] * 1000
+    }
+
+
+def run_benchmarks(runs, adb_delay, scrcpy_delay):
+    """Run Every Benchmark.
+
+    Args:
+        runs (int): Times to run each benchmark
+        adb_delay (float): Seconds the fake adb (and adb server) take to answer
+        scrcpy_delay (float): Seconds the fake scrcpy takes to show its first frame
+
+    Returns:
+        dict: stats() of each benchmark, by name
+
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work:
+        bin_dir = os.path.join(work, "bin")
+        os.mkdir(bin_dir)
+        make_fakes(bin_dir)
+        env = dict(os.environ, PATH=bin_dir + os.pathsep + os.environ.get("PATH", ""),
+                   XDG_CACHE_HOME=os.path.join(work, "cache"),
+                   FAKE_ADB_DELAY=str(adb_delay), FAKE_SCRCPY_DELAY=str(scrcpy_delay))
+        os.environ.update(env)
+        os.chdir(work)
+        main.store = main.ProfileStore(os.path.join(work, "scrcpy-gui-settings.json"), delay=0)
+        values = main.values_from_db()
+        values.update({"use_bitrate": True, "bitrate": "8M", "use_resolution": True, "resolution": "1024",
+                       "use_framerate": True, "framerate": "60", "set_orien": True, "orien": "180 degrees"})
+
+        def save():
+            main.save_db(values)
+            main.store.flush()
+        results["settings-save"] = stats(measure(save, runs))
+        results["settings-load"] = stats(measure(main.get_db, runs))
+        results["command-build"] = stats(measure(lambda: main.build_command(values), runs))
+
+        def cold_start():
+            subprocess.run([sys.executable, os.path.join(here, "main.py"), "--from-settings"], env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        results["startup-from-settings"] = stats(measure(cold_start, runs))
+        results["startup-import"] = stats(measure(lambda: subprocess.run(
+            [sys.executable, "-c", "import main"], cwd=here, env=env, check=True), runs))
+
+        server = FakeAdbServer(adb_delay)
+        server.start()
+        device = socket.socket()  # Stands in for the phone's adb listener in Wi-Fi mode
+        device.bind(("127.0.0.1", 0))
+        device.listen(64)
+        device_port = str(device.getsockname()[1])
+
+        def usb_connect():
+            main.start_adb_server("adb")
+            main.wait_for_usb_device("adb", monotonic() + 10)
+        main.adb_client = main.AdbClient(port=server.port)
+        results["usb-connect"] = stats(measure(usb_connect, runs))
+        results["wifi-connect"] = stats(measure(lambda: main.connect_wifi("adb", "127.0.0.1", device_port), runs))
+        main.adb_client = main.AdbClient(port=1)  # Nothing listens there, so every step falls back to the adb binary
+        results["wifi-connect-adb-binary"] = stats(measure(lambda: main.connect_wifi("adb", "127.0.0.1", device_port), runs))
+        main.adb_client = main.AdbClient(port=server.port)
+
+        def first_frame():
+            supervisor = main.ScrcpySupervisor(main.build_command(values), on_line=lambda stream, line: None)
+            start = monotonic()
+            supervisor.run()
+            return monotonic() - start
+        results["scrcpy-run"] = stats(measure(first_frame, runs))
+        device.close()
+        os.chdir(here)
+    return results
+
+
+def git_commit():
+    """Get Current Commit.
+
+    Returns:
+        str: Commit hash of the checkout, or "unknown"
+
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def previous_run(commit):
+    """Get Last Run From Another Commit.
+
+    Args:
+        commit (str): Current commit
+
+    Returns:
+        dict: History entry, or None if there isn't one
+
+    """
+    previous = None
+    try:
+        with open(history_file) as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["commit"] != commit:
+                    previous = entry
+    except (OSError, ValueError):
+        pass
+    return previous
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description="Benchmark scrcpy-gui against fake adb and scrcpy.")
+    parser.add_argument("--runs", type=int, default=20, help="times to run each benchmark (default: 20)")
+    parser.add_argument("--adb-delay", type=float, default=0.0, help="seconds fake adb takes to answer (default: 0)")
+    parser.add_argument("--scrcpy-delay", type=float, default=0.0, help="seconds fake scrcpy takes to show a frame (default: 0)")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="median slowdown against the previous commit that counts as a regression (default: 1.2)")
+    parser.add_argument("--no-save", action="store_true", help="don't add this run to the history")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.runs, args.adb_delay, args.scrcpy_delay)
+    commit = git_commit()
+    previous = previous_run(commit)
+    regressions = []
+    print()
+    print("{:<26} {:>9} {:>9} {:>9} {:>9} {:>9}".format("Benchmark (ms)", "min", "median", "p95", "max", "change"))
+    for name, result in results.items():
+        change = ""
+        if previous is not None and name in previous["results"]:
+            ratio = result["median"] / max(previous["results"][name]["median"], 1e-6)
+            change = "{:+.0f}%".format((ratio - 1) * 100)
+            if ratio > args.threshold:
+                regressions.append(name)
+                change += " !"
+        print("{:<26} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9}".format(
+            name, result["min"], result["median"], result["p95"], result["max"], change))
+    if previous is not None:
+        print("Compared against {}.".format(previous["commit"]))
+    if regressions:
+        print("Regressions: {}".format(", ".join(regressions)))
+    if not args.no_save:
+        os.makedirs(os.path.dirname(history_file), exist_ok=True)
+        with open(history_file, "a") as f:
+            f.write(json.dumps({"commit": commit, "runs": args.runs, "adb_delay": args.adb_delay,
+                                "scrcpy_delay": args.scrcpy_delay, "results": results}) + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_benchmark())
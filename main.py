@@ -19,14 +19,168 @@ from subprocess import call
 from shutil import which,rmtree
 import sys
 import os
-import platform
+import re
 import json
-from time import sleep
+import shutil
+import atexit
+import argparse
+import struct
+import socket
+import subprocess
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import signal
+from time import sleep, monotonic
 
 class CommandExecutionError(Exception):
     pass
 
 
+rotation_options = {
+    "Natural orientation": "0",
+    "90 degrees counterclockwise": "1",
+    "180 degrees": "2",
+    "90 degrees clockwise": "3"
+}
+
+# Form key -> database key for every option save_db stores
+db_keys = {
+    "usb_mode": "is_usb",
+    "addr": "addr",
+    "use_port": "use_port",
+    "port": "port",
+    "use_resolution": "use_resolution",
+    "resolution": "resolution",
+    "use_bitrate": "use_bitrate",
+    "bitrate": "bitrate",
+    "use_sn": "use_sn",
+    "sn": "sn",
+    "use_fullscreen": "full",
+    "use_touches": "taps",
+    "sleep_screen": "sleep",
+    "on_top": "top",
+    "no_device_control": "no_control",
+    "use_framerate": "use_framerate",
+    "framerate": "framerate",
+    "set_orien": "set_orien",
+    "orien": "orien",
+    "keep_awake": "keep_awake",
+    "auto_tune": "auto_tune",
+    "record": "record",
+    "record_dir": "record_dir",
+    "segment_seconds": "segment_seconds",
+    "segment_mb": "segment_mb",
+    "record_max_mb": "record_max_mb",
+    "record_compress": "record_compress"
+}
+
+# Defaults used by the GUI when a database key is missing
+db_defaults = {
+    "is_usb": True,
+    "addr": "",
+    "use_port": False,
+    "port": "",
+    "use_resolution": False,
+    "resolution": "",
+    "use_bitrate": False,
+    "bitrate": "",
+    "use_sn": False,
+    "sn": "",
+    "full": False,
+    "taps": False,
+    "sleep": False,
+    "top": False,
+    "no_control": False,
+    "use_framerate": False,
+    "framerate": "",
+    "set_orien": False,
+    "orien": "",
+    "keep_awake": False,
+    "auto_tune": False,
+    "record": False,
+    "record_dir": "",
+    "segment_seconds": "300",
+    "segment_mb": "",
+    "record_max_mb": "",
+    "record_compress": False
+}
+
+# Element key -> whether it's disabled, given the form values. Elements are only enabled when the
+# option they belong to is on and makes sense in the chosen mode.
+widget_rules = {
+    "addr": lambda v: not v["wifi_mode"],
+    "use_port": lambda v: not v["wifi_mode"],
+    "port": lambda v: not v["wifi_mode"] or not v["use_port"],
+    "use_sn": lambda v: v["wifi_mode"],
+    "sn": lambda v: v["wifi_mode"] or not v["use_sn"],
+    "resolution": lambda v: not v["use_resolution"],
+    "bitrate": lambda v: not v["use_bitrate"],
+    "framerate": lambda v: not v["use_framerate"],
+    "orien": lambda v: not v["set_orien"],
+    "sleep_screen": lambda v: v["no_device_control"],
+    "no_device_control": lambda v: v["sleep_screen"],
+    "record_dir": lambda v: not v["record"],
+    "record_browse": lambda v: not v["record"],
+    "segment_seconds": lambda v: not v["record"],
+    "segment_mb": lambda v: not v["record"],
+    "record_max_mb": lambda v: not v["record"],
+    "record_compress": lambda v: not v["record"]
+}
+
+
+class WidgetState:
+    """Widget State Engine.
+
+    Works out which elements should be disabled from widget_rules, and only sends Tk the elements
+    whose state actually changed, since every update is a round trip to Tk (and to the X server
+    when forwarded).
+
+    """
+
+    def __init__(self, rules, values):
+        """
+        Args:
+            rules (dict): Element key -> function of the form values returning whether it's disabled
+            values (dict): Form values the window was built with
+
+        """
+        self.rules = rules
+        self.state = self.compute(values)
+
+    def compute(self, values):
+        """Compute Widget State.
+
+        Args:
+            values (dict): Form values
+
+        Returns:
+            dict: Element key -> whether it should be disabled
+
+        """
+        return {key: bool(rule(values)) for key, rule in self.rules.items()}
+
+    def apply(self, window, values):
+        """Apply Widget State.
+
+        Args:
+            window (sg.Window): Window holding the elements
+            values (dict): Current form values
+
+        Returns:
+            list: Keys of the elements that were updated
+
+        """
+        changed = []
+        for key, disabled in self.compute(values).items():
+            if self.state.get(key) != disabled:
+                window.Element(key).Update(disabled=disabled)
+                self.state[key] = disabled
+                changed.append(key)
+        return changed
+
+
 def full(file_name):
     """Full Path.
 
@@ -42,24 +196,226 @@ def full(file_name):
     return os.path.expandvars(os.path.expanduser(file_name))
 
 
-def get_db():
+class ProfileStore:
+    """Profile Store.
+
+    Keeps named settings profiles in scrcpy-gui-settings.json, along with the last profile used
+    overall and for each device serial. Writes are coalesced (saving several times in a row only
+    writes the file once), merged with whatever other scrcpy-gui instances wrote in the meantime,
+    and done by writing a temporary file and renaming it over the old one, so a crash mid-write
+    can't leave a torn file behind.
+
+    Files from before profiles existed hold a single settings dict, which becomes the "default" profile.
+
+    """
+
+    schema = 2
+
+    def __init__(self, path, delay=0.5):
+        """
+        Args:
+            path (str): Settings file
+            delay (float): Seconds to wait for more changes before writing
+
+        """
+        self.path = os.path.abspath(path)  # So changing directories later can't point writes somewhere else
+        self.delay = delay
+        self.data = self._empty()
+        self._dirty_profiles = set()
+        self._dirty_devices = set()
+        self._dirty_last = False
+        self._timer = None
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _empty():
+        return {"schema": ProfileStore.schema, "last_profile": "default", "profiles": {}, "device_profiles": {}}
+
+    def _read(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            raise ValueError("Settings file doesn't hold a dict")
+        if data.get("schema") != self.schema:
+            data = {"schema": self.schema, "last_profile": "default", "profiles": {"default": data}, "device_profiles": {}}
+        if not isinstance(data.get("profiles"), dict) or not isinstance(data.get("device_profiles"), dict):
+            raise ValueError("Settings file is missing its profiles")
+        return data
+
+    def load(self):
+        """Load Profiles From Disk.
+
+        Returns:
+            bool: Whether the file could be loaded
+
+        """
+        with self._lock:
+            try:
+                self.data = self._read()
+                print("Successfully loaded database!")
+                return True
+            except FileNotFoundError:
+                print("Couldn't find database file! Defaulting to empty database...")
+            except ValueError:
+                print("Failed decoding database! Defaulting to new database...")
+            self.data = self._empty()
+            return False
+
+    def names(self):
+        """Get Profile Names.
+
+        Returns:
+            list: Names of every saved profile
+
+        """
+        return sorted(self.data["profiles"])
+
+    def get(self, name):
+        """Get Profile.
+
+        Args:
+            name (str): Profile name
+
+        Returns:
+            dict: Copy of the profile's settings. {} if there's no such profile.
+
+        """
+        return dict(self.data["profiles"].get(name, {}))
+
+    def profile_for_device(self, serial=None):
+        """Get Last Used Profile for Device.
+
+        Args:
+            serial (str): Device serial. None for the last profile used on any device
+
+        Returns:
+            str: Profile name
+
+        """
+        return self.data["device_profiles"].get(serial) or self.data["last_profile"]
+
+    def use(self, name, serial=None):
+        """Remember Profile Use.
+
+        Args:
+            name (str): Profile that was used
+            serial (str): Device it was used on, if known
+
+        """
+        with self._lock:
+            self.data["last_profile"] = name
+            self._dirty_last = True
+            if serial:
+                self.data["device_profiles"][serial] = name
+                self._dirty_devices.add(serial)
+            self._schedule()
+
+    def put(self, name, settings, serial=None):
+        """Save Profile.
+
+        Args:
+            name (str): Profile name
+            settings (dict): Profile settings
+            serial (str): Device the profile is being used on, if known
+
+        """
+        with self._lock:
+            self.data["profiles"][name] = dict(settings)
+            self._dirty_profiles.add(name)
+            self.use(name, serial)
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Write Pending Changes Now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not (self._dirty_profiles or self._dirty_devices or self._dirty_last):
+                return
+            try:
+                merged = self._read()  # Keep profiles other instances saved since we loaded
+            except (OSError, ValueError):
+                merged = self._empty()
+            for name in self._dirty_profiles:
+                merged["profiles"][name] = self.data["profiles"][name]
+            for serial in self._dirty_devices:
+                merged["device_profiles"][serial] = self.data["device_profiles"][serial]
+            if self._dirty_last:
+                merged["last_profile"] = self.data["last_profile"]
+            directory = os.path.dirname(self.path)
+            try:
+                import tempfile  # Only needed once there's something to save, so kept out of startup
+                fd, tmp_path = tempfile.mkstemp(prefix=".scrcpy-gui-settings-", dir=directory)
+                with os.fdopen(fd, "w") as dbf:
+                    json.dump(merged, dbf)
+                    dbf.flush()
+                    os.fsync(dbf.fileno())
+                os.replace(tmp_path, self.path)
+                print("Database written!")
+            except OSError:
+                print(json.dumps(merged))
+                print("Database failed to be written and is dumped to screen!")
+                return
+            self.data = merged
+            self._dirty_profiles.clear()
+            self._dirty_devices.clear()
+            self._dirty_last = False
+
+
+store = ProfileStore(full("./scrcpy-gui-settings.json"))
+atexit.register(store.flush)
+profile = "default"  # Name of the profile db holds
+db = {}
+
+
+def switch_profile(name):
+    """Switch Profile.
+
+    Args:
+        name (str): Profile to make db hold
+
+    """
+    global db, profile
+    profile = name
+    db = store.get(name)
+
+
+def connected_serial():
+    """Get Connected Device.
+
+    Returns:
+        str: Serial of the only connected device, or None if there isn't exactly one (or adb isn't running)
+
+    """
+    try:
+        devices = [d["serial"] for d in adb_client.devices() if d["state"] == "device"]
+    except (OSError, CommandExecutionError):
+        return None
+    return devices[0] if len(devices) == 1 else None
+
+
+def get_db(name=None, serial=None):
     """Get Database.
 
+    Args:
+        name (str): Profile to get. None for the last profile used on the device with the given serial
+        serial (str): Serial of the device being used, if known
+
     Returns:
         dict: Database. {} if database fails to be read or found on disk.
 
     """
-    try:
-        with open(full("./scrcpy-gui-settings.json")) as f:
-            db = json.load(f)
-            print("Successfully loaded database!")
-    except FileNotFoundError:
-        db = {}
-        print("Couldn't find database file! Defaulting to empty database...")
-    except json.decoder.JSONDecodeError:
-        db = {}
-        print("Failed decoding database! Defaulting to new database...")
-    return db
+    global profile
+    store.load()
+    profile = name or store.profile_for_device(serial)
+    return store.get(profile)
 
 
 def pip_install(package):
@@ -82,17 +438,48 @@ def pip_install(package):
         sys.exit(1)
 
 
-def apt_install(package):
+def apt_missing(packages):
+    """Get Missing apt Packages.
+
+    Args:
+        packages (list): apt packages
+
+    Returns:
+        list: The packages that aren't installed yet
+
+    """
+    result = subprocess.run(["dpkg-query", "-W", "-f", "${Package} ${Status}\n"] + packages,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    installed = {line.split()[0].split(":")[0] for line in result.stdout.splitlines() if line.endswith(" installed")}
+    return [package for package in packages if package not in installed]
+
+
+def apt_install(package, update=False):
     """Install apt Package.
 
+    Installs everything in one apt run, skipping packages that are already installed.
+
     Args:
-        package (str): Package(s) from apt to install
+        package (str or list): Package(s) from apt to install
+        update (bool): Whether to update the package lists first (only if something needs installing)
+
+    Raises:
+        CommandExecutionError: If installing fails while running as a task (otherwise scrcpy-gui exits)
 
     """
+    packages = package.split() if isinstance(package, str) else list(package)
     try:
-        run(["sudo", "apt", "install", package, "-y"])
+        missing = apt_missing(packages) if which("dpkg-query") is not None else packages
+        if not missing:
+            print("Already installed: {}".format(" ".join(packages)))
+            return
+        if update:
+            run(["sudo", "apt", "update"])
+        run(["sudo", "apt", "install", "-y"] + missing)
     except CommandExecutionError:
-        msg = "Failed to install {}! Leaving scrcpy-gui...".format(package)
+        if current_task() is not None:  # Reported by whatever is showing the task
+            raise
+        msg = "Failed to install {}! Leaving scrcpy-gui...".format(" ".join(packages))
         try:
             sg.Popup(msg)
         except NameError:
@@ -122,15 +509,16 @@ def get_val(key, default):
         return default
 
 
-def write_db():
-    """Write Database to File."""
-    try:
-        with open(full("./scrcpy-gui-settings.json"), "w") as dbf:
-            json.dump(db, dbf)
-        print("Database written!")
-    except FileNotFoundError:
-        print(json.dumps(db))
-        print("Database failed to be written and is dumped to screen!")
+def write_db(serial=None):
+    """Write Database to File.
+
+    Writes are coalesced, so the file is written shortly after (or when scrcpy-gui exits).
+
+    Args:
+        serial (str): Serial of the device the settings are being used with, if known
+
+    """
+    store.put(profile, db, serial)
 
 
 def save_db(values):
@@ -141,424 +529,4002 @@ def save_db(values):
 
     """
     print("Saving database...")
-    global db
-    db = {
-    "is_usb": values["usb_mode"],
-    "addr": values["addr"],
-    "use_port": values["use_port"],
-    "port": values["port"],
-    "use_resolution": values["use_resolution"], 
-    "resolution": values["resolution"],
-    "use_bitrate": values["use_bitrate"], 
-    "bitrate": values["bitrate"],
-    "use_sn": values["use_sn"], 
-    "sn": values["sn"],
-    "full": values["use_fullscreen"], "taps": values["use_touches"],
-    "sleep": values["sleep_screen"], "top": values["on_top"],
-    "no_control": values["no_device_control"],
-    "use_framerate": values["use_framerate"], "framerate": values["framerate"],
-    "set_orien": values["set_orien"], "orien": values["orien"],
-    "keep_awake": values["keep_awake"]
-    }
-    write_db()
+    global db, profile
+    profile = values.get("profile") or profile
+    db = dict(db)
+    db.update({db_key: values[form_key] for form_key, db_key in db_keys.items()})
+    if values["wifi_mode"]:
+        serial = "{}:{}".format(values["addr"], values["port"] if values["use_port"] and values["port"] != "" else "5555")
+    elif values["use_sn"] and values["sn"] != "":
+        serial = values["sn"]
+    else:
+        serial = None
+    write_db(serial)
 
 
-def run(cmd_list):
-    """Run Command."""
-    err = call(cmd_list)
-    if err != 0:
-        raise CommandExecutionError("Error running {}".format(" ".join(cmd_list)))
+class TaskCancelled(Exception):
+    pass
 
 
-db = get_db()
-is_crostini = os.path.isfile("/usr/share/themes/CrosAdapta/index.theme")
+_task_context = threading.local()
 
-try:
-    import tkinter
-except ImportError:
-    tkinter_install = input("tkinter not installed! Would you like to try to install it [Y/n]?")
-    if tkinter_install.lower() == "y" or tkinter_install.lower() == "yes" or tkinter_install.lower() == "":
-        if which("apt") is not None:
-            apt_install("python3-tk")
-        elif which("apt-get") is not None:
-            run(["sudo", "apt-get", "install", "python3-tk", "-y"])
-        elif which("pacman") is not None:
-            run(["sudo", "pacman", "-S", "tk", "--noconfirm"])
-        elif which("dnf") is not None:
-            run(["sudo", "dnf", "install", "python3-tkinter", "-y"])
-        else:
-            print("Your system does not support automatic installation of tkinter! Please install it!")
-            sys.exit(1)
-        import tkinter
-    else:
-        sys.exit(1)
 
-try:
-    import PySimpleGUI as sg
-except ImportError:
-    pysgui_install = input("PySimpleGUI not installed! Would you like to install it [Y/n]?")
-    if pysgui_install.lower() == "y" or pysgui_install.lower() == "yes" or pysgui_install.lower() == "":
-        pip_install("PySimpleGUI")
-        import PySimpleGUI as sg
-    else:
-        sys.exit(1)
+def current_task():
+    """Get Current Task.
 
+    Returns:
+        Task: Task the calling thread is running for a TaskRunner, or None
 
-def scrcpy_install_linux():
-    """Setup scrcpy and adb on Linux."""
-    if os.getuid() != 0:
-        sg.Popup("Root is required to complete this first time setup! Please run this script as root!")
-        sys.exit(1)
-    else:
-        print("Creating progress window")
-        bar_layout = [
-            [sg.Text("Preparing scrcpy and adb...")],
-            [sg.ProgressBar(100, orientation='h', size=(20, 20), key='installbar')]
-        ]
-        install_window = sg.Window("Installing...", bar_layout)
-        bar = install_window.FindElement("installbar")
-        install_window.Read(timeout=0)
-        print("Installing scrcpy and ADB...")
-        bar.UpdateBar(2)
-        try:
-            import distro
-        except ImportError:
-            if sg.PopupYesNo("The 'distro' package isn't installed! Would you like scrcpy-gui to install it?") == "Yes":
-                pip_install("distro")
-                import distro
-            else:
-                sys.exit(1)
-        dist = distro.linux_distribution(full_distribution_name=False)
-        ###ADB###
-        bar.UpdateBar(10)
-        if which("apt") is not None:
-            print("Installing ADB through apt")
-            run(["sudo", "apt", "update"])
-            bar.UpdateBar(30)
-            run(["sudo", "apt", "install", "adb", "-y"])
-        elif which("apt-get") is not None:
-            print("Installing ADB through apt-get")
-            run(["sudo", "apt-get", "update"])
-            bar.UpdateBar(30)
-            run(["sudo", "apt", "install", "adb", "-y"])
-        elif which("pacman") is not None:
-            print("Installing ADB through pacman")
-            run(["sudo", "pacman", "-S", "android-tools", "--noconfirm"])
-        elif which("yum") is not None:
-            print("Installing ADB through yum")
-            run(["yum", "-y", "install", "android-tools"])
-        else:
-            pass  # Attempt to use compile from source below
-        bar.UpdateBar(60)
-        ###SCRCPY###
-        if which("pacman") is not None:
-            print("Installing scrcpy through pacman")
-            run(["sudo", "pacman", "-S", "scrcpy", "--noconfirm"])
-        else:
-            if which("apt") is not None:
-                print("Compiling and installing scrcpy from source!")
-                print("Installing requirements through apt!")
-                apt_install("git")
-                bar.UpdateBar(63)
-                print("Compiling and installing scrcpy")
-                os.chdir("/tmp/")
-                try:
-                    rmtree("/tmp/scrcpy-gui-setup")
-                except FileNotFoundError:
-                    pass
-                os.mkdir("/tmp/scrcpy-gui-setup")
-                os.chdir("/tmp/scrcpy-gui-setup/")
-                ecode = call(["git", "clone", "--branch", "v1.14", "https://github.com/Genymobile/scrcpy.git"])
-                if ecode != 0:
-                    print("Error getting source code! Please check the error log above! Exiting setup...")
-                    sys.exit(1)
-                bar.UpdateBar(65)
-                print("Getting compile dependencies...")
-                apt_install("ffmpeg libsdl2-2.0-0")
-                bar.UpdateBar(70)
-                apt_install("gcc git pkg-config meson ninja-build")
-                bar.UpdateBar(75)
-                apt_install("libavcodec-dev libavformat-dev libavutil-dev")
-                bar.UpdateBar(80)
-                apt_install("libsdl2-dev")
-                bar.UpdateBar(82)
-                os.chdir("/tmp/scrcpy-gui-setup/scrcpy")
-                print("Getting pre-built server binary")
-                ecode = call(["wget", "https://github.com/Genymobile/scrcpy/releases/download/v1.14/scrcpy-server-v1.14"])
-                if ecode != 0:
-                    print("Error getting server JAR! Please see the error above! Exiting...")
-                    sys.exit(1)
-                os.rename("scrcpy-server-v1.14", "server.jar")
-                bar.UpdateBar(88)
-                print("Compiling...")
-                ecode = call(["meson", "x", "--buildtype", "release", "--strip", "-Db_lto=true", "-Dprebuilt_server=/tmp/scrcpy-gui-setup/scrcpy/server.jar"])
-                if ecode != 0:
-                    print("Error while compiling! Exiting...")
-                    sys.exit(1)
-                bar.UpdateBar(93)
-                ecode = call(["ninja", "-Cx"])
-                if ecode != 0:
-                    print("Error while compiling! Exiting...")
-                    sys.exit(1)
-                bar.UpdateBar(97)
-                ecode = call(["sudo", "ninja", "-Cx", "install"])
-                if ecode != 0:
-                    print("Error while installing! Exiting...")
-                    sys.exit(1)
-            else:
-                sg.Popup("Your OS doesn't support automatic installation of scrcpy.")
-                sys.exit(1)
-        bar.UpdateBar(100)
-        sg.Popup("Please run this script again as your user (not root!).")
-        sys.exit(0)
+    """
+    return getattr(_task_context, "task", None)
 
 
-def scrcpy_install_win():
-    """Setup scrcpy and adb on Windows."""
-    print("Creating progress window")
-    bar_layout = [
-        [sg.Text("Preparing scrcpy and adb...")],
-        [sg.ProgressBar(100, orientation='h', size=(20, 20), key='installbar')]
-    ]
-    install_window = sg.Window("Installing...", bar_layout)
-    bar = install_window.FindElement("installbar")
-    install_window.Read(timeout=0)
-    print("Installing scrcpy and ADB...")
-    os.chdir(full("%temp%"))
-    bar.UpdateBar(1)
-    print("Removing old scrcpy-gui-setup folder (if it exists!).")
-    try:
-        rmtree("scrcpy-gui-setup")
-    except FileNotFoundError:
-        pass
-    bar.UpdateBar(2)
-    os.mkdir("scrcpy-gui-setup")
-    is_64bits = sys.maxsize > 2**32
-    os.chdir(full("%temp%/scrcpy-gui-setup"))
-    try:
-        import requests
-    except ImportError:
-        print("Requests module isn't installed!")
-        install = sg.PopupYesNo("requests isn't installed! Would you like to install it?")
-        if install == "Yes":
-            pip_install("requests")
-    bar.UpdateBar(3)
-    print("Downloading scrcpy zip...")
-    if is_64bits:
-        print("Choosing 64-bit version")
-        f = requests.get("https://github.com/Genymobile/scrcpy/releases/download/v1.10/scrcpy-win64-v1.10.zip")
-    else:
-        print("Choosing 32-bit version.")
-        f = requests.get("https://github.com/Genymobile/scrcpy/releases/download/v1.10/scrcpy-win32-v1.10.zip")
-    bar.UpdateBar(4)
-    open("scrcpy.zip", "wb").write(f.content)
-    bar.UpdateBar(60)
-    scrcpy_install = full("%userprofile%/scrcpy")
-    print("Extracting ZIP to {}".format(scrcpy_install))
-    try:
-        import zipfile
-    except ImportError:
-        print("zipfile module isn't installed!")
-        sg.Popup("zipfile module is not installed! Please install it!")
-        sys.exit(1)
-    print("Deleting old scrcpy install area (if it exists!)")
-    with zipfile.ZipFile("scrcpy.zip", "r") as z_file:
+class Task:
+    """Background Task.
+
+    Handed to each function a TaskRunner runs, to report progress and log lines back to the window
+    and to notice being cancelled. run() uses it when called from a task, so commands run from a
+    task stream their output to it and are stopped when the task is cancelled.
+
+    """
+
+    def __init__(self, name, post):
+        """
+        Args:
+            name (str): Name of the task, sent along with all of its events
+            post (function): Called with an event name and its value, from the task's thread
+
+        """
+        self.name = name
+        self.post = post
+        self.cancel_event = threading.Event()
+        self.process = None
+        self.last_pct = None
+        self.lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        """Check for Cancel.
+
+        Raises:
+            TaskCancelled: If the task has been cancelled
+
+        """
+        if self.cancelled:
+            raise TaskCancelled(self.name)
+
+    def progress(self, pct, message=None):
+        """Report Progress.
+
+        Also a cancel point, so a step reporting progress stops there once the task is cancelled.
+
+        Args:
+            pct (int): Percentage (0-100) of the task that's done
+            message (str): What the task is doing now, if it changed
+
+        Raises:
+            TaskCancelled: If the task has been cancelled
+
+        """
+        self.check()
+        pct = int(pct)
+        if pct != self.last_pct or message is not None:
+            self.last_pct = pct
+            self.post("task_progress", (self.name, pct, message))
+
+    def log(self, line):
+        """Send Log Line.
+
+        Args:
+            line (str): Line to show in the window's log
+
+        """
+        self.post("task_log", (self.name, line))
+
+    def sleep(self, seconds):
+        """Sleep Until Cancelled.
+
+        Args:
+            seconds (float): Seconds to sleep
+
+        Raises:
+            TaskCancelled: If the task is cancelled before then
+
+        """
+        if self.cancel_event.wait(seconds):
+            raise TaskCancelled(self.name)
+
+    def run(self, cmd_list):
+        """Run Command in Task.
+
+        Args:
+            cmd_list (list): Command to run
+
+        Returns:
+            int: Exit code of the command
+
+        Raises:
+            TaskCancelled: If the task is cancelled (the command is terminated)
+
+        """
+        self.check()
+        self.log("$ " + " ".join(cmd_list))
         try:
-            rmtree(full(scrcpy_install))
-        except FileNotFoundError:
-            pass
-        bar.UpdateBar(65)
-        print("Doing ZIP extract...")
-        os.mkdir(scrcpy_install)
-        os.chdir(scrcpy_install)
-        z_file.extractall(full(scrcpy_install))
-        bar.UpdateBar(100)
-
-
-if (which("adb") == None or which("scrcpy") == None) and not(os.path.isfile(full("%userprofile%/scrcpy/scrcpy.exe"))):
-    print("ADB/scrcpy not installed!")
-    osys = platform.system()
-    auto_install_prompt = "Would you like to automatically install ADB and scrcpy? By doing so, you agree to any and all license agreements that come with those pieces of software!"
-    if osys == "Windows":
-        response = sg.PopupYesNo(auto_install_prompt)
-        if response == "Yes":
-            scrcpy_install_win()
-        else:
-            print("Not installing! Exiting...")
-            sys.exit(1)
-    elif osys == "Linux":
+            process = subprocess.Popen(cmd_list, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, universal_newlines=True, errors="replace")
+        except OSError as e:
+            raise CommandExecutionError("Error running {}: {}".format(" ".join(cmd_list), e))
+        with self.lock:
+            self.process = process
+        if self.cancelled:  # Cancelled while starting, before cancel() could see the process
+            process.terminate()
         try:
-            response = sg.PopupYesNo(auto_install_prompt)
-        except tkinter.TclError:
-            if is_crostini:
-                print("#"*20)
-                print("Please run the following command: xhost +si:localuser:root")
-                print("#"*20)
-            sys.exit(1)
-        if response == "Yes":
-            scrcpy_install_linux()
-        else:
-            print("Not installing! Exiting...")
-            sys.exit(1)
-    else:
-        print("Your OS does not support automatic installation! Exiting...")
-        sg.Popup("ADB not installed! Please install ADB (comes with scrcpy on Windows), and add it to your PATH!")
-        sys.exit(1)
+            for line in process.stdout:
+                self.log(line.rstrip())
+            code = process.wait()
+        finally:
+            with self.lock:
+                self.process = None
+        self.check()
+        return code
 
+    def cancel(self):
+        """Cancel Task, terminating the command it's running, if any."""
+        self.cancel_event.set()
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                self.process.terminate()
 
-print("Building GUI...")
-rotation_options = {
-    "Natural orientation": "0",
-    "90 degrees counterclockwise": "1",
-    "180 degrees": "2",
-    "90 degrees clockwise": "3"
-}
-layout = [
-    [sg.Text("Select options:")],
-    [sg.Text("Mode: "), sg.Radio("USB", "mode", default=get_val("is_usb", True), enable_events=True, key="usb_mode"), sg.Radio("Wi-Fi", "mode", enable_events=True, key="wifi_mode", default=not(get_val("is_usb", True)))],
-    [sg.Text("IP Address: "), sg.InputText(key='addr', default_text=get_val("addr", ""), disabled=get_val("is_usb", True), size=(20,None))],
-    [sg.Checkbox("Custom port: ", key="use_port", default=get_val("use_port", False), enable_events=True, disabled=not(get_val("is_usb", True))), sg.InputText(key='port',size=(8,None),disabled=not(get_val("use_port", False)))],
-    [sg.Checkbox("Custom resolution: ", key="use_resolution", enable_events=True, default=get_val("use_resolution", False)), sg.InputText(key='resolution',size=(8,None), disabled=not(get_val("use_resolution", False)), default_text=get_val("resolution", ""))],
-    [sg.Checkbox("Custom bitrate: ", key="use_bitrate", enable_events=True, default=get_val("use_bitrate", False)), sg.InputText(key='bitrate',size=(4,None),disabled=not(get_val("use_bitrate", False)), default_text=get_val("bitrate", ""))],
-    [sg.Checkbox("Device serial number: ", key="use_sn", enable_events=True, default=get_val("use_sn", False)), sg.InputText(key='sn',size=(32,None),disabled=not(get_val("use_sn", False)), default_text=get_val("sn", ""))],
-    [sg.Checkbox("Set maximum framerate: ", key="use_framerate", enable_events=True, default=get_val("use_framerate", False)), sg.InputText(key='framerate',size=(4,None), disabled=not(get_val("use_framerate", True)), default_text=get_val("framerate", ""))],
-    [sg.Checkbox("Set Orientation: ", key="set_orien", enable_events=True, default=get_val("set_orien", False)), sg.Combo(list(rotation_options.keys()), key="orien", disabled=not(get_val("set_orien", True)), default_value=get_val("orien", ""))],
-    [sg.Checkbox("Fullscreen mode", key="use_fullscreen", default=get_val("full", False)), sg.Checkbox("Show physical screen taps", key="use_touches", default=get_val("taps", False))],
-    [sg.Checkbox("Turn screen off on start", key="sleep_screen", enable_events=True, default=get_val("sleep", False)), sg.Checkbox("Keep scrcpy window on top", key="on_top", default=get_val("top", False))],
-    [sg.Checkbox("Disable device control", key="no_device_control", enable_events=True, default=get_val("no_control", False)), sg.Checkbox("Keep device awake", key="keep_awake", enable_events=True, default=get_val("keep_awake", False))],
-    [sg.Text("If there is an option to allow USB debugging, please allow it now!")],
-    [sg.Button("Start scrcpy"), sg.Button("Exit"), sg.Button("Save settings")]
-    ]
 
-print("Launching GUI...")
-try:
-    window = sg.Window('scrcpy GUI', layout=layout)
-except tkinter.TclError:
-    if is_crostini:
-        print("#"*20)
-        print("Please run the following command: xhost +si:localuser:root")
-        print("#"*20)
-    sys.exit(1)
-
-cancel = False #Used later to check if we should exit after breaking out of the loop
-while True:
-    event, values = window.Read()
-    if event in (None, 'Exit'): #None if we're closing, Exit if exit button is pressed
-        cancel = True
-        break
-    elif event == "Start scrcpy":
-        break
-    elif event == "Save settings":
-        save_db(values)
-    if values["wifi_mode"] == True:
-        window.Element('addr').Update(disabled=False)
-        window.Element('use_port').Update(disabled=False)
-        window.Element('port').Update(disabled=not(values['use_port']))
-        window.Element('sn').Update(disabled=True)
-        window.Element('use_sn').Update(disabled=True) #Allow entering of IP address and port, and disable use of serial number checking
-    else:
-        window.Element('addr').Update(disabled=True)
-        window.Element('use_port').Update(disabled=True)
-        window.Element('port').Update(disabled=True)
-        window.Element('sn').Update(disabled=not(values["use_sn"]))
-        window.Element('use_sn').Update(disabled=False) #Disable entering of IP address and port, and enable use of serial number checking
-    if event == "use_resolution":
-        window.Element("resolution").Update(disabled=not(values["use_resolution"]))
-    elif event == "use_bitrate":
-        window.Element("bitrate").Update(disabled=not(values["use_bitrate"]))
-    elif event == "no_device_control":
-        window.Element("sleep_screen").Update(disabled=values["no_device_control"])
-    elif event == "sleep_screen":
-        window.Element("no_device_control").Update(disabled=values["sleep_screen"])
-    elif event == "use_sn":
-        window.Element("sn").Update(disabled=not(values["use_sn"]))
-    elif event == "set_orien":
-        window.Element("orien").Update(disabled=not(values["set_orien"])) #User must check box for option before being allowed to input said option
-
-save_db(values)
-
-if cancel: #Window closed or exit button pressed
-    print("Exiting...")
-    sys.exit(0)
-
-print("Closing window...") #Close window while starting scrcpy
-window.Close()
-
-if not(which("adb") != None and which("scrcpy") != None):
-    os.chdir(full("%userprofile%/scrcpy/"))
-    print("Using scrcpy directory installed by scrcpy-gui!")
-
-print("Killing ADB server...") #Kill any previous ADB servers, just in case.
-run(["adb", "kill-server"])
-
-sg.Popup("Plug in your phone, then click Ok!")
-adb_layout = [
-    [sg.Text("Connecting to phone and launching scrcpy...")],
-    [sg.ProgressBar(100, orientation='h', size=(20, 20), key='adbbar')]
-]
-adb_window = sg.Window("Launching...", adb_layout)
-bar = adb_window.FindElement("adbbar")
-adb_window.Read(timeout=0)
-if values["wifi_mode"]:
-    print("Wi-Fi preparation.")
-    if values['addr'] == '':
-        sg.Popup("IP address not specified!")
-        sys.exit(1)
-    else:
-        if values['use_port'] and values['port'] != "":
+class TaskRunner:
+    """Background Task Runner.
+
+    Runs blocking steps (adb, installing packages, downloading, compiling) on a thread pool so the
+    window showing them stays responsive. Everything is reported through post() as events, to be
+    given to window.write_event_value():
+
+        "task_progress": (name, pct, message)
+        "task_log": (name, line)
+        "task_done": (name, result, error), where error is None, "cancelled" or the exception raised
+
+    """
+
+    def __init__(self, post, workers=4):
+        """
+        Args:
+            post (function): Called with an event name and its value, from worker threads
+            workers (int): Most tasks to run at once
+
+        """
+        from concurrent.futures import ThreadPoolExecutor  # The headless launch doesn't need it, so kept out of startup
+        self.post = post
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.tasks = []
+
+    def submit(self, name, func):
+        """Start Task.
+
+        Args:
+            name (str): Name of the task
+            func (function): Called with the Task, returning the task's result
+
+        Returns:
+            Task: The started task
+
+        """
+        task = Task(name, self.post)
+        self.tasks.append(task)
+
+        def work():
+            _task_context.task = task
             try:
-                port = int(values['port'])
-                if port < 0 or port > 65536:
-                    sg.Popup("Port must be between 0 and 65536!")
-                    sys.exit(1)
-                port = str(port)
-            except ValueError:
-                sg.Popup("Port must be a number!")
-                sys.exit(1)
-        else:
-            port = "5555"
-        run(["adb", "shell", "exit"])
-        bar.UpdateBar(10)
-        connect_to = str(values["addr"] + ":{}".format(port)) 
-        bar.UpdateBar(20)
-        run(["adb", "tcpip", port])
-        bar.UpdateBar(30)
-        sleep(2) #Waiting here can help things a decent amount of times
-        bar.UpdateBar(35)
-        run(["adb", "connect", connect_to])
-        bar.UpdateBar(45)
-        sg.Popup("Unplug your phone, then click Ok!")
-
-
-command = ["scrcpy"]
-print("Running scrcpy command...")
-bar.UpdateBar(46)
-
-if values["use_resolution"] and values["resolution"] != "":
-    command.append("-m " + values["resolution"])
-if values["use_bitrate"] and values["bitrate"] != "":
-    command.append("-b " + values["bitrate"])
-if values["usb_mode"] and values["use_sn"] and values["sn"] != "":
-    command.append("-s " + values["sn"])
-if values["use_framerate"] and values["framerate"] != "":
-    try:
-        command.append("--max-fps " + str(int(values["framerate"])))  # Conversion makes sure we have a number
-    except ValueError:
-        print("Skipping framerate max because it isn't a number!")
-if values["use_fullscreen"]:
-    command.append("-f")
-if values["set_orien"]:
-    command.append("--lock-video-orientation " + rotation_options[values["orien"]])
-if values["use_touches"]:
-    command.append("-t") 
-if values["no_device_control"]:
-    command.append("-n")
-if values["sleep_screen"]:
-    command.append("-S")
-if values["on_top"]:
-    command.append("-T")
-if values["keep_awake"]:
-    command.append("-w") #Assemble command
-bar.UpdateBar(100)
-print("Running command: " + " ".join(command))
-sys.exit(os.system(" ".join(command)) / 256) #Run scrcpy command and give the exit code scrcpy gives us
\ No newline at end of file
+                result = func(task)
+            except TaskCancelled:
+                self.post("task_done", (name, None, "cancelled"))
+            except Exception as e:
+                self.post("task_done", (name, None, e))
+            else:
+                self.post("task_done", (name, result, None))
+            finally:
+                _task_context.task = None
+        self.pool.submit(work)
+        return task
+
+    def cancel(self):
+        """Cancel Every Task."""
+        for task in self.tasks:
+            task.cancel()
+
+    def shutdown(self):
+        """Stop Taking Tasks, without waiting for running ones (cancel() them first)."""
+        self.pool.shutdown(wait=False)
+
+
+def run(cmd_list):
+    """Run Command.
+
+    When called from a TaskRunner task, output goes to the task's log instead of the terminal, and
+    the command is terminated if the task is cancelled.
+
+    Args:
+        cmd_list (list): Command to run
+
+    Raises:
+        CommandExecutionError: If the command fails
+
+    """
+    task = current_task()
+    err = task.run(cmd_list) if task is not None else call(cmd_list)
+    if err != 0:
+        raise CommandExecutionError("Error running {}".format(" ".join(cmd_list)))
+
+
+class Tracer:
+    """Launch Tracer.
+
+    Timestamps each phase of a launch, from loading settings to scrcpy showing its first frame.
+    Events are kept in memory and, once a trace file is set with open(), also appended to it as
+    JSON lines, one object per event:
+
+        {"run": "...", "name": "connect", "start": 1.234, "duration": 0.056, "time": 1600000000.0}
+
+    "start" is seconds since scrcpy-gui started, "duration" is 0 for one-off marks, and any extra
+    details (such as the device serial) are added as more keys.
+
+    """
+
+    def __init__(self):
+        self.run_id = os.urandom(6).hex()
+        self.started = monotonic()
+        self.events = []
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        """Start Writing Trace File.
+
+        Args:
+            path (str): File to append events to. Events recorded before this are written too.
+
+        """
+        with self._lock:
+            try:
+                self._file = open(path, "a")
+            except OSError as e:
+                print("Couldn't open trace file {}: {}".format(path, e))
+                return
+            for event in self.events:
+                self._write(event)
+
+    def _write(self, event):
+        if self._file is not None:
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+
+    def record(self, name, start, **info):
+        """Record Phase.
+
+        Args:
+            name (str): Phase name
+            start (float): time.monotonic() value the phase started at. It ends now.
+            **info: Extra details to keep with the event
+
+        """
+        now = monotonic()
+        event = {"run": self.run_id, "name": name, "start": round(start - self.started, 6),
+                 "duration": round(now - start, 6), "time": time.time() - (now - start)}
+        event.update(info)
+        with self._lock:
+            self.events.append(event)
+            self._write(event)
+
+    def mark(self, name, **info):
+        """Record Moment.
+
+        Args:
+            name (str): Name of what just happened
+            **info: Extra details to keep with the event
+
+        """
+        self.record(name, monotonic(), **info)
+
+    @contextmanager
+    def span(self, name, **info):
+        """Record Phase Around Block.
+
+        Args:
+            name (str): Phase name
+            **info: Extra details to keep with the event
+
+        """
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, start, **info)
+
+    def summary(self):
+        """Print Summary.
+
+        Prints every recorded phase with when it started and how long it took, in order.
+
+        """
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event["start"])
+        print("{:<28} {:>10} {:>10}  {}".format("Phase", "At", "Took", "Details"))
+        for event in events:
+            details = " ".join("{}={}".format(k, v) for k, v in event.items() if k not in ("run", "name", "start", "duration", "time") and v is not None)
+            print("{:<28} {:>9.3f}s {:>9.3f}s  {}".format(event["name"], event["start"], event["duration"], details))
+        frames = [event for event in events if event["name"] == "first-frame"]
+        if frames:
+            print("Time to first frame: {:.3f}s".format(frames[0]["start"]))
+
+
+tracer = Tracer()
+
+# scrcpy logs this once the first frame has been decoded and the stream is up
+first_frame_markers = ("Initial texture", "Texture:")
+
+
+class AdbClient:
+    """adb Server Client.
+
+    Speaks the adb host protocol to the adb server directly, so adb commands don't need
+    a new adb process each. Every request is a 4 digit hex length followed by the request,
+    and is answered with OKAY or FAIL. The server closes host connections after answering,
+    so each request opens its own (loopback) socket.
+
+    Raises OSError (such as ConnectionRefusedError) if the server isn't running, and
+    CommandExecutionError if the server answers with FAIL.
+
+    """
+
+    def __init__(self, host="127.0.0.1", port=5037, timeout=5):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _open(self):
+        return socket.create_connection((self.host, self.port), timeout=self.timeout)
+
+    @staticmethod
+    def _read_exact(sock, size):
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("adb server closed the connection")
+            data += chunk
+        return data
+
+    @staticmethod
+    def _read_all(sock):
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def _read_string(self, sock):
+        size = int(self._read_exact(sock, 4), 16)
+        return self._read_exact(sock, size).decode("utf-8", "replace")
+
+    def _send(self, sock, request):
+        data = request.encode("utf-8")
+        sock.sendall("{:04x}".format(len(data)).encode("ascii") + data)
+        status = self._read_exact(sock, 4)
+        if status == b"FAIL":
+            raise CommandExecutionError("adb: {}".format(self._read_string(sock)))
+        if status != b"OKAY":
+            raise CommandExecutionError("adb: unexpected reply {!r} to {}".format(status, request))
+
+    def request(self, request):
+        """Send Host Request.
+
+        Args:
+            request (str): Host request, such as "host:version"
+
+        Returns:
+            str: The server's answer
+
+        """
+        with self._open() as sock:
+            self._send(sock, request)
+            return self._read_string(sock)
+
+    def version(self):
+        """Get adb Server Version.
+
+        Returns:
+            int: Version of the running adb server
+
+        """
+        return int(self.request("host:version"), 16)
+
+    def devices(self):
+        """List Devices.
+
+        Returns:
+            list: A dict for every device, with "serial", "state" and any extra info adb gives
+                (such as "usb", "product" and "model").
+
+        """
+        return parse_devices(self.request("host:devices-l"))
+
+    def connect(self, addr):
+        """Connect to Device Over TCP.
+
+        Args:
+            addr (str): Address to connect to, as "ip:port"
+
+        Returns:
+            str: adb's message, such as "connected to 192.168.1.2:5555"
+
+        """
+        return self.request("host:connect:" + addr)
+
+    def disconnect(self, addr):
+        """Disconnect From Device Over TCP.
+
+        Args:
+            addr (str): Address to disconnect from, as "ip:port"
+
+        Returns:
+            str: adb's message
+
+        """
+        return self.request("host:disconnect:" + addr)
+
+    def transport(self, serial=None, usb=False):
+        """Open Device Transport.
+
+        Args:
+            serial (str): Serial of device to talk to. None for the only connected device
+            usb (bool): Talk to the only USB device, ignoring serial
+
+        Returns:
+            socket.socket: Socket that device service requests can be sent on
+
+        """
+        if usb:
+            request = "host:transport-usb"
+        elif serial:
+            request = "host:transport:" + serial
+        else:
+            request = "host:transport-any"
+        sock = self._open()
+        try:
+            self._send(sock, request)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def service(self, service, serial=None, usb=False):
+        """Run Device Service.
+
+        Args:
+            service (str): Service to run on the device, such as "shell:echo hi"
+            serial (str): Serial of device to talk to. None for the only connected device
+            usb (bool): Talk to the only USB device, ignoring serial
+
+        Returns:
+            bytes: Everything the service sent back
+
+        """
+        with self.transport(serial, usb) as sock:
+            self._send(sock, service)
+            return self._read_all(sock)
+
+    def stream(self, service, out, serial=None, check=None, chunk_size=65536):
+        """Stream Device Service Output.
+
+        Writes what the service sends to out as it arrives, without holding all of it in memory.
+
+        Args:
+            service (str): Service to run on the device, such as "exec:screencap -p"
+            out (file): Binary file to write to
+            serial (str): Serial of device to talk to. None for the only connected device
+            check (function): Called before every chunk, such as to raise if the caller gave up
+
+        Returns:
+            int: Amount of bytes written
+
+        """
+        written = 0
+        with self.transport(serial) as sock:
+            self._send(sock, service)
+            while True:
+                if check is not None:
+                    check()
+                chunk = sock.recv(chunk_size)
+                if not chunk:
+                    return written
+                out.write(chunk)
+                written += len(chunk)
+
+    def shell(self, command, serial=None):
+        """Run Shell Command on Device.
+
+        Args:
+            command (str): Command to run
+            serial (str): Serial of device to run on. None for the only connected device
+
+        Returns:
+            str: Output of the command
+
+        """
+        return self.service("shell:" + command, serial).decode("utf-8", "replace")
+
+    def tcpip(self, port, serial=None, usb=False):
+        """Restart adbd on Device in TCP Mode.
+
+        Args:
+            port (str): Port for the device to listen on
+            serial (str): Serial of device. None for the only connected device
+            usb (bool): Use the only USB device, ignoring serial
+
+        Returns:
+            str: adbd's message
+
+        """
+        return self.service("tcpip:" + str(port), serial, usb).decode("utf-8", "replace")
+
+    def track_devices(self):
+        """Track Devices.
+
+        Keeps a connection to the server open, which the server writes the device list to
+        whenever it changes.
+
+        Yields:
+            list: The device list (see devices()), once right away and again on every change
+
+        """
+        for request in ("host:track-devices-l", "host:track-devices"):  # Older servers don't know the -l variant
+            sock = self._open()
+            try:
+                self._send(sock, request)
+                break
+            except CommandExecutionError:
+                sock.close()
+                if request == "host:track-devices":
+                    raise
+        with sock:
+            sock.settimeout(None)
+            while True:
+                yield parse_devices(self._read_string(sock))
+
+
+adb_client = AdbClient()
+
+
+class DeviceTracker(threading.Thread):
+    """Device Tracker.
+
+    Background thread keeping an up-to-date list of connected devices from the adb server's
+    device tracking stream, reconnecting with backoff if the server goes away.
+
+    Attributes:
+        devices (list): Latest device list (see AdbClient.devices())
+        callback (function): Called from the tracker thread with the new device list on every change. May be swapped at any time.
+
+    """
+
+    def __init__(self, client=None, callback=None):
+        super().__init__(daemon=True)
+        self.client = client or adb_client
+        self.callback = callback
+        self.devices = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        delays = backoff(0.1, 2.0)
+        while not self._stop_event.is_set():
+            try:
+                for devices in self.client.track_devices():
+                    delays = backoff(0.1, 2.0)
+                    if self._stop_event.is_set():
+                        return
+                    self.devices = devices
+                    callback = self.callback
+                    if callback is not None:
+                        callback(devices)
+            except (OSError, CommandExecutionError) as e:
+                print("Lost device tracker connection: {}".format(e))
+            self._stop_event.wait(next(delays))
+
+    def stop(self):
+        """Stop Tracking."""
+        self._stop_event.set()
+
+
+def parse_devices(output):
+    """Parse Device List.
+
+    Args:
+        output (str): Output of "adb devices -l" (or the host:devices-l request)
+
+    Returns:
+        list: A dict for every device, with "serial", "state" and any extra info adb gives.
+
+    """
+    devices = []
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) < 2 or line.startswith("List of devices"):
+            continue
+        device = {"serial": parts[0], "state": parts[1]}
+        for part in parts[2:]:
+            key, _, val = part.partition(":")
+            device[key] = val
+        devices.append(device)
+    return devices
+
+
+def start_adb_server(adb):
+    """Start adb Server If Needed.
+
+    Args:
+        adb (str): adb executable, only used if the server isn't running yet
+
+    """
+    with tracer.span("adb-start-server"):
+        try:
+            print("adb server version {} already running".format(adb_client.version()))
+        except OSError:
+            print("Starting adb server...")
+            run([adb, "start-server"])
+
+
+def backoff(start=0.05, cap=1.0, factor=2):
+    """Exponential Backoff Delays.
+
+    Args:
+        start (float): First delay in seconds
+        cap (float): Largest delay in seconds
+        factor (float): Amount to multiply the delay by each time
+
+    Yields:
+        float: Delay to wait before the next attempt
+
+    """
+    delay = start
+    while True:
+        yield delay
+        delay = min(delay * factor, cap)
+
+
+def wait_for_port(addr, port, deadline):
+    """Wait for TCP Listener.
+
+    Polls until something accepts connections on addr:port, backing off between attempts.
+
+    Args:
+        addr (str): IP address to poll
+        port (int): Port to poll
+        deadline (float): time.monotonic() value to give up at
+
+    Returns:
+        bool: Whether a listener was found before the deadline
+
+    """
+    for delay in backoff():
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            with socket.create_connection((addr, port), timeout=min(1.0, remaining)):
+                return True
+        except OSError:
+            pass
+        sleep(min(delay, max(deadline - monotonic(), 0)))
+
+
+def wait_for_usb_device(adb, deadline):
+    """Wait for USB Device.
+
+    Args:
+        adb (str): adb executable, only used if the adb server can't be reached
+        deadline (float): time.monotonic() value to give up at
+
+    Raises:
+        CommandExecutionError: If no USB device shows up before the deadline
+
+    """
+    for delay in backoff():
+        try:
+            devices = adb_client.devices()
+        except OSError:
+            try:
+                subprocess.run([adb, "wait-for-usb-device"], timeout=max(deadline - monotonic(), 0), check=True)
+                return
+            except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
+                break
+        if any(d["state"] == "device" and ":" not in d["serial"] for d in devices):
+            return
+        if monotonic() + delay >= deadline:
+            break
+        sleep(delay)
+    raise CommandExecutionError("No USB device found! Make sure it's plugged in with USB debugging allowed.")
+
+
+def connect_wifi(adb, addr, port, switch_to_tcpip=True, progress=None, timeout=20):
+    """Connect to Device Over Wi-Fi.
+
+    Each step waits for the device to actually be ready instead of sleeping for a fixed time,
+    polling with exponential backoff until the overall timeout runs out.
+
+    Args:
+        adb (str): adb executable
+        addr (str): IP address of the device
+        port (str): Port the device should listen for adb on
+        switch_to_tcpip (bool): Whether to first switch the USB-connected device to adb over TCP
+        progress (function): Called with a percentage (0-100) as each step finishes
+        timeout (float): Seconds the whole sequence may take
+
+    Returns:
+        dict: Seconds each step took
+
+    Raises:
+        CommandExecutionError: If a step fails or the timeout is hit
+
+    """
+    deadline = monotonic() + timeout
+    timings = {}
+    connect_to = "{}:{}".format(addr, port)
+
+    def step_done(name, start, pct):
+        timings[name] = monotonic() - start
+        tracer.record("adb-" + name, start, device=connect_to)
+        print("{} took {:.3f}s".format(name, timings[name]))
+        if progress is not None:
+            progress(pct)
+
+    if switch_to_tcpip:
+        start = monotonic()
+        wait_for_usb_device(adb, deadline)
+        step_done("wait-for-device", start, 25)
+        start = monotonic()
+        try:
+            print(adb_client.tcpip(port, usb=True).strip())
+        except OSError:
+            run([adb, "tcpip", port])
+        step_done("tcpip", start, 50)
+    start = monotonic()
+    if not wait_for_port(addr, int(port), deadline):
+        raise CommandExecutionError("Device isn't listening on {}!".format(connect_to))
+    step_done("listener", start, 75)
+    start = monotonic()
+    for delay in backoff():
+        try:
+            message = adb_client.connect(connect_to)
+        except OSError:
+            try:
+                message = subprocess.run([adb, "connect", connect_to], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                         universal_newlines=True, timeout=max(deadline - monotonic(), 0)).stdout
+            except subprocess.TimeoutExpired:
+                raise CommandExecutionError("Timed out connecting to {}!".format(connect_to))
+        print(message.strip())
+        if message.startswith("connected to") or message.startswith("already connected to"):
+            break
+        if monotonic() + delay >= deadline:
+            raise CommandExecutionError("Failed to connect to {}!".format(connect_to))
+        sleep(delay)
+    step_done("connect", start, 100)
+    print("Wi-Fi connect took {:.3f}s in total".format(sum(timings.values())))
+    return timings
+
+
+class WifiMonitor(threading.Thread):
+    """Wi-Fi Connection Monitor.
+
+    Pings a device connected over Wi-Fi every interval seconds by running an empty shell command
+    through the adb server, so each round trip covers adbd on the device. After misses failed pings
+    in a row the connection counts as dropped, and it's reconnected (adb disconnect, then adb connect)
+    with backoff until a ping gets through again, after which on_reconnect is called.
+
+    Attributes:
+        latencies (collections.deque): Round trip times of the latest pings, in seconds
+        drops (int): Amount of times the connection dropped
+        reconnects (int): Amount of times the connection was brought back
+        on_reconnect (function): Called after the connection comes back, from the monitor's thread
+
+    """
+
+    def __init__(self, serial, interval=2.0, timeout=1.0, misses=2, reconnect_timeout=60, history=30):
+        """
+        Args:
+            serial (str): Device to monitor, as "ip:port"
+            interval (float): Seconds between pings while the connection is fine
+            timeout (float): Seconds a ping may take before it counts as failed
+            misses (int): Failed pings in a row that count as the connection dropping
+            reconnect_timeout (float): Seconds to keep trying to reconnect before giving up
+            history (int): Amount of round trip times to keep
+
+        """
+        super().__init__(daemon=True)
+        self.serial = serial
+        self.interval = interval
+        self.timeout = timeout
+        self.misses = misses
+        self.reconnect_timeout = reconnect_timeout
+        self.latencies = deque(maxlen=history)
+        self.drops = 0
+        self.reconnects = 0
+        self.on_reconnect = None
+        self._client = AdbClient(adb_client.host, adb_client.port, timeout)
+        self._stop_event = threading.Event()
+        self._wake = threading.Event()
+        self._pinged = threading.Event()
+
+    def ping(self):
+        """Ping Device.
+
+        Returns:
+            float: Round trip time in seconds
+
+        Raises:
+            OSError: If the device doesn't answer in time
+            CommandExecutionError: If adb can't reach the device
+
+        """
+        start = monotonic()
+        self._client.shell("echo", self.serial)
+        return monotonic() - start
+
+    def _reconnect(self):
+        start = monotonic()
+        for delay in backoff(0.2, 2.0):
+            if self._stop_event.is_set() or monotonic() - start > self.reconnect_timeout:
+                return False
+            try:
+                try:
+                    adb_client.disconnect(self.serial)
+                except CommandExecutionError:
+                    pass  # Not connected anymore
+                if adb_client.connect(self.serial).startswith(("connected to", "already connected to")):
+                    self.latencies.append(self.ping())
+                    tracer.record("wifi-reconnect", start, device=self.serial)
+                    print("Reconnected to {} after {:.2f}s".format(self.serial, monotonic() - start))
+                    return True
+            except (OSError, CommandExecutionError):
+                pass
+            self._stop_event.wait(delay)
+
+    def run(self):
+        missed = 0
+        while not self._stop_event.is_set():
+            try:
+                self.latencies.append(self.ping())
+                missed = 0
+                self._pinged.set()
+            except (OSError, CommandExecutionError) as e:
+                missed += 1
+                if missed >= self.misses:
+                    self.drops += 1
+                    print("Lost connection to {} ({})! Reconnecting...".format(self.serial, e))
+                    if not self._reconnect():
+                        if not self._stop_event.is_set():
+                            print("Couldn't reconnect to {}!".format(self.serial))
+                        return
+                    missed = 0
+                    self.reconnects += 1
+                    self._pinged.set()
+                    if self.on_reconnect is not None:
+                        self.on_reconnect()
+            self._wake.wait(self.interval if missed == 0 else min(self.interval, 0.25))  # Check again soon after a miss
+            self._wake.clear()
+
+    def wait_healthy(self):
+        """Wait Until Device Answers.
+
+        Pings right away, and if that fails waits for the monitor to get the connection back.
+
+        Returns:
+            bool: False if the connection didn't come back (or the monitor already gave up on it)
+
+        """
+        if not self.is_alive():
+            return False
+        self._pinged.clear()
+        try:
+            self.latencies.append(self.ping())
+            return True
+        except (OSError, CommandExecutionError):
+            pass
+        self._wake.set()
+        deadline = monotonic() + self.reconnect_timeout + self.interval * self.misses
+        while self.is_alive() and monotonic() < deadline:
+            if self._pinged.wait(0.25):
+                return True
+        return False
+
+    def stats(self):
+        """Get Connection Stats.
+
+        Returns:
+            dict: Latest and median round trip time in milliseconds (None before the first ping),
+                and the amount of drops and reconnects
+
+        """
+        import statistics  # Only needed once a session ends, so kept out of startup
+        latencies = list(self.latencies)
+        return {
+            "latency": latencies[-1] * 1000 if latencies else None,
+            "median_latency": statistics.median(latencies) * 1000 if latencies else None,
+            "drops": self.drops,
+            "reconnects": self.reconnects
+        }
+
+    def stop(self):
+        """Stop Monitoring."""
+        self._stop_event.set()
+        self._wake.set()
+
+
+adb_version = 0x01000000
+adb_max_data = 4096
+adb_states = {b"CNXN": "device", b"AUTH": "unauthorized", b"STLS": "device"}  # Reply to our CNXN -> device state
+
+
+def adb_message(command, arg0, arg1, data=b""):
+    """Build adb Transport Message.
+
+    Args:
+        command (bytes): Four letter command, such as b"CNXN"
+        arg0 (int): First argument
+        arg1 (int): Second argument
+        data (bytes): Payload
+
+    Returns:
+        bytes: 24 byte header followed by the payload
+
+    """
+    code = struct.unpack("<I", command)[0]
+    return struct.pack("<6I", code, arg0, arg1, len(data), sum(data) & 0xffffffff, code ^ 0xffffffff) + data
+
+
+async def probe_adb(addr, port, timeout=0.5):
+    """Probe adb Listener.
+
+    Connects and sends the CNXN message adb starts every connection with. adbd answers with CNXN
+    (with its banner), AUTH if it wants us to authenticate first, or STLS if it wants TLS.
+
+    Args:
+        addr (str): IP address to probe
+        port (int): Port to probe
+        timeout (float): Seconds the connection and answer may take
+
+    Returns:
+        dict: "addr", "port", "state" and "model" (from the banner, or "" if it didn't send one),
+            or None if nothing speaking adb answered
+
+    """
+    import asyncio  # Only needed for scans, and slow to import, so kept out of startup
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(addr, port), timeout)
+        writer.write(adb_message(b"CNXN", adb_version, adb_max_data, b"host::\0"))
+        header = await asyncio.wait_for(reader.readexactly(24), timeout)
+        command, _, _, length, _, magic = struct.unpack("<6I", header)
+        command = struct.pack("<I", command)
+        if command not in adb_states or magic != struct.unpack("<I", command)[0] ^ 0xffffffff:
+            return None
+        banner = ""
+        if command == b"CNXN" and 0 < length <= 65536:
+            banner = (await asyncio.wait_for(reader.readexactly(length), timeout)).decode("utf-8", "replace")
+        model = ""
+        for prop in banner.partition("::")[2].rstrip("\0").split(";"):
+            if prop.startswith("ro.product.model="):
+                model = prop.split("=", 1)[1]
+        return {"addr": addr, "port": port, "state": adb_states[command], "model": model}
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, struct.error):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def local_network():
+    """Get Local Network.
+
+    Returns:
+        str: The /24 network of the address used to reach the internet, such as "192.168.1.0/24"
+
+    Raises:
+        OSError: If there's no network to reach the internet through
+
+    """
+    import ipaddress
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect(("192.0.2.1", 9))  # Only picks a route, nothing is sent
+        addr = sock.getsockname()[0]
+    return str(ipaddress.ip_network(addr + "/24", strict=False))
+
+
+def scan_network(network=None, port=5555, concurrency=128, timeout=0.5, progress=None):
+    """Scan Network for adb Devices.
+
+    Probes every host of the network at once (at most concurrency at a time) with probe_adb().
+
+    Args:
+        network (str): Network to scan, such as "192.168.1.0/24". Defaults to local_network()
+        port (int): Port devices listen for adb on
+        concurrency (int): Most connections to have open at once
+        timeout (float): Seconds each host has to answer
+        progress (function): Called with the amount of hosts probed so far and the total
+
+    Returns:
+        list: Devices found (see probe_adb()), in address order
+
+    Raises:
+        ValueError: If network isn't a valid network
+        OSError: If no network is given and the local one can't be found
+
+    """
+    import asyncio
+    import ipaddress
+    network = network or local_network()
+    hosts = [str(host) for host in ipaddress.ip_network(network, strict=False).hosts()]
+    done = [0]
+
+    async def scan():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def probe(host):
+            async with semaphore:
+                result = await probe_adb(host, port, timeout)
+            done[0] += 1
+            if progress is not None:
+                progress(done[0], len(hosts))
+            return result
+        probes = [asyncio.ensure_future(probe(host)) for host in hosts]
+        try:
+            return await asyncio.gather(*probes)
+        except BaseException:  # Such as progress() raising TaskCancelled, so don't leave probes running
+            for pending in probes:
+                pending.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+            raise
+
+    loop = asyncio.new_event_loop()
+    try:
+        with tracer.span("scan-network", network=network, hosts=len(hosts)):
+            results = loop.run_until_complete(scan())
+    finally:
+        loop.close()
+    return [result for result in results if result is not None]
+
+
+def cache_dir():
+    """Get Cache Directory.
+
+    Returns:
+        str: Directory scrcpy-gui keeps its caches in. Created if it doesn't exist.
+
+    """
+    if os.name == "nt":
+        base = full("%localappdata%")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or full("~/.cache")
+    path = os.path.join(base, "scrcpy-gui")
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        pass
+    return path
+
+
+cache_lock = threading.Lock()  # Fleet mode updates the caches from a thread per device
+
+
+def update_cache(cache_file, key, value):
+    """Update Cache Entry.
+
+    The cache is read again under cache_lock, so entries other threads added in the meantime are
+    kept, and written to a temporary file that's renamed over it, so it's never seen half written.
+
+    Args:
+        cache_file (str): JSON cache file
+        key (str): Entry to set
+        value: Value to set it to
+
+    """
+    import tempfile  # Only needed once there's something to cache, so kept out of startup
+    with cache_lock:
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        cache[key] = value
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(cache_file) + "-", dir=os.path.dirname(cache_file))
+            with os.fdopen(fd, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, cache_file)
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def find_tools():
+    """Find adb and scrcpy.
+
+    Looks for adb and scrcpy on the PATH, falling back to the folder scrcpy-gui
+    installs scrcpy to on Windows. A successful lookup is cached on disk, keyed by
+    PATH and the modification times of both binaries, so later launches only need
+    two stat calls instead of a PATH walk.
+
+    Returns:
+        dict: Paths for "adb" and "scrcpy". A path is None if it wasn't found.
+
+    """
+    path_var = os.environ.get("PATH", "")
+    cache_file = os.path.join(cache_dir(), "tools.json")
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+        if cached["path"] == path_var and all(_mtime(cached["tools"][name]) == mtime for name, mtime in cached["mtimes"].items()):
+            return cached["tools"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    tools = {}
+    for name in ("adb", "scrcpy"):
+        tools[name] = which(name)
+        if tools[name] is None and os.path.isfile(full("%userprofile%/scrcpy/{}.exe".format(name))):
+            tools[name] = full("%userprofile%/scrcpy/{}.exe".format(name))
+    if None not in tools.values():  # Only cache complete lookups, so a fresh install is always picked up
+        try:
+            with open(cache_file, "w") as f:
+                json.dump({"path": path_var, "tools": tools, "mtimes": {name: _mtime(p) for name, p in tools.items()}}, f)
+        except OSError:
+            pass
+    return tools
+
+
+def values_from_db(overrides=None):
+    """Get Form Values from Database.
+
+    Args:
+        overrides (dict): Database values to use instead of the ones in the database
+
+    Returns:
+        dict: The same dictionary the GUI hands back when "Start scrcpy" is pressed, built from the database.
+
+    """
+    overrides = overrides or {}
+    values = {form_key: overrides.get(db_key, get_val(db_key, db_defaults[db_key])) for form_key, db_key in db_keys.items()}
+    values["wifi_mode"] = not values["usb_mode"]
+    return values
+
+
+def get_port(values):
+    """Get Wi-Fi Port.
+
+    Args:
+        values (dict): Dictionary from user selected options
+
+    Returns:
+        str: Port to use for Wi-Fi connections
+
+    Raises:
+        ValueError: If the custom port isn't a valid port number
+
+    """
+    if values['use_port'] and values['port'] != "":
+        try:
+            port = int(values['port'])
+        except ValueError:
+            raise ValueError("Port must be a number!")
+        if port < 0 or port > 65536:
+            raise ValueError("Port must be between 0 and 65536!")
+        return str(port)
+    return "5555"
+
+
+def build_command(values, scrcpy="scrcpy"):
+    """Build scrcpy Command.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        scrcpy (str): scrcpy executable to run
+
+    Returns:
+        list: scrcpy command
+
+    """
+    command = [scrcpy]
+    if values["use_resolution"] and values["resolution"] != "":
+        command.extend(["-m", values["resolution"]])
+    if values["use_bitrate"] and values["bitrate"] != "":
+        command.extend(["-b", values["bitrate"]])
+    if values["usb_mode"] and values["use_sn"] and values["sn"] != "":
+        command.extend(["-s", values["sn"]])
+    if values["wifi_mode"] and values["addr"] != "":
+        command.extend(["-s", target_serial(values)])  # So the phone can stay plugged in, along with any other device
+    if values["use_framerate"] and values["framerate"] != "":
+        try:
+            command.extend(["--max-fps", str(int(values["framerate"]))])  # Conversion makes sure we have a number
+        except ValueError:
+            print("Skipping framerate max because it isn't a number!")
+    if values["use_fullscreen"]:
+        command.append("-f")
+    if values["set_orien"]:
+        command.extend(["--lock-video-orientation", rotation_options[values["orien"]]])
+    if values["use_touches"]:
+        command.append("-t")
+    if values["no_device_control"]:
+        command.append("-n")
+    if values["sleep_screen"]:
+        command.append("-S")
+    if values["on_top"]:
+        command.append("-T")
+    if values["keep_awake"]:
+        command.append("-w")
+    return command
+
+
+def parse_cpus(text):
+    """Parse CPU List.
+
+    Args:
+        text (str): CPUs as a list of numbers and ranges, such as "0-3,6"
+
+    Returns:
+        set: CPU numbers
+
+    Raises:
+        ValueError: If the list isn't valid
+
+    """
+    cpus = set()
+    for part in text.split(","):
+        first, _, last = part.strip().partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    if not cpus:
+        raise ValueError("No CPUs given!")
+    return cpus
+
+
+class ResourcePolicy:
+    """scrcpy Resource Policy.
+
+    The nice level and CPU affinity are set by starting scrcpy through nice and taskset, so they're in
+    place before scrcpy runs and are inherited by everything it starts. Where those aren't installed,
+    they're set right after scrcpy starts instead, which can miss threads and processes it started first.
+    CPU and memory limits use a cgroup v2 group per process, created next to scrcpy-gui's own cgroup
+    and joined right after scrcpy starts, and are skipped with a warning if cgroup v2 isn't there or
+    scrcpy-gui isn't allowed to create groups.
+
+    """
+
+    def __init__(self, nice=None, cpus=None, cpu_max=None, memory_max=None):
+        """
+        Args:
+            nice (int): Nice level to run scrcpy at
+            cpus (set): CPUs scrcpy may run on
+            cpu_max (float): Most CPU time scrcpy may use, in percent of one CPU
+            memory_max (int): Most memory scrcpy may use, in bytes
+
+        """
+        self.nice = nice
+        self.cpus = cpus
+        self.cpu_max = cpu_max
+        self.memory_max = memory_max
+        self._cgroup_failed = False
+        self._nice_cmd = which("nice") if nice is not None else None
+        self._taskset_cmd = which("taskset") if cpus is not None else None
+
+    @staticmethod
+    def cgroup_root():
+        """Get cgroup v2 Group of scrcpy-gui.
+
+        Returns:
+            str: Path of the cgroup scrcpy-gui runs in, or None if cgroup v2 isn't used
+
+        """
+        try:
+            with open("/proc/self/cgroup") as f:
+                for line in f:
+                    if line.startswith("0::"):
+                        path = os.path.join("/sys/fs/cgroup", line[3:].strip().lstrip("/"))
+                        return path if os.path.isfile(os.path.join(path, "cgroup.procs")) else None
+        except OSError:
+            pass
+        return None
+
+    def _group(self, pid):
+        root = self.cgroup_root()
+        if root is None:
+            return None
+        # Groups are made next to ours, since a group with processes in it can't have limited children
+        # (except for the root group)
+        parent = root if os.path.normpath(root) == "/sys/fs/cgroup" else os.path.dirname(root)
+        return os.path.join(parent, "scrcpy-gui-{}".format(pid))
+
+    def _join_cgroup(self, pid):
+        group = self._group(pid)
+        if group is None:
+            raise OSError("cgroup v2 isn't available")
+        os.mkdir(group)
+        try:
+            if self.cpu_max is not None:
+                with open(os.path.join(group, "cpu.max"), "w") as f:
+                    f.write("{} 100000".format(max(int(self.cpu_max * 1000), 1000)))
+            if self.memory_max is not None:
+                with open(os.path.join(group, "memory.max"), "w") as f:
+                    f.write(str(self.memory_max))
+            with open(os.path.join(group, "cgroup.procs"), "w") as f:
+                f.write(str(pid))
+        except OSError:
+            os.rmdir(group)
+            raise
+
+    def wrap(self, command):
+        """Wrap Command to Start Under Policy.
+
+        Args:
+            command (list): scrcpy command
+
+        Returns:
+            list: Command starting scrcpy through nice and taskset, where they're installed and needed
+
+        """
+        prefix = []
+        if self._nice_cmd is not None:
+            try:
+                current = os.getpriority(os.PRIO_PROCESS, 0)
+            except (AttributeError, OSError):
+                current = 0
+            prefix.extend([self._nice_cmd, "-n", str(self.nice - current)])  # nice takes an adjustment to ours
+        if self._taskset_cmd is not None:
+            prefix.extend([self._taskset_cmd, "-c", ",".join(str(cpu) for cpu in sorted(self.cpus))])
+        return prefix + list(command)
+
+    def apply(self, pid):
+        """Apply Rest of Policy to Started Process.
+
+        Sets whatever wrap() couldn't, and moves the process into its cgroup.
+
+        Args:
+            pid (int): Process ID of scrcpy
+
+        """
+        if self.nice is not None and self._nice_cmd is None:
+            try:
+                os.setpriority(os.PRIO_PROCESS, pid, self.nice)
+            except (AttributeError, OSError) as e:
+                print("Couldn't set scrcpy's nice level: {}".format(e))
+        if self.cpus is not None and self._taskset_cmd is None:
+            try:
+                os.sched_setaffinity(pid, self.cpus)
+            except (AttributeError, OSError) as e:
+                print("Couldn't set scrcpy's CPU affinity: {}".format(e))
+        if (self.cpu_max is not None or self.memory_max is not None) and not self._cgroup_failed:
+            try:
+                self._join_cgroup(pid)
+            except OSError as e:
+                self._cgroup_failed = True  # Won't work for later processes either
+                group = self._group(pid)
+                print("Couldn't limit scrcpy's CPU and memory with a cgroup: {}".format(e))
+                if group is not None:
+                    print("The cpu and memory controllers need to be enabled for it, by writing \"+cpu +memory\" to {}".format(
+                        os.path.join(os.path.dirname(group), "cgroup.subtree_control")))
+
+    def release(self, pid):
+        """Remove Process's cgroup Once It Exited.
+
+        Args:
+            pid (int): Process ID of scrcpy
+
+        """
+        if self.cpu_max is None and self.memory_max is None:
+            return
+        group = self._group(pid)
+        if group is not None:
+            try:
+                os.rmdir(group)
+            except OSError:
+                pass
+
+
+class ResourceSampler(threading.Thread):
+    """Process Resource Sampler.
+
+    Samples the CPU use and resident memory of a process from /proc every interval seconds.
+    Does nothing where /proc isn't there.
+
+    Attributes:
+        samples (collections.deque): Latest samples, as (time.monotonic(), CPU percent of one CPU, RSS in bytes)
+
+    """
+
+    def __init__(self, interval=1.0, history=300):
+        """
+        Args:
+            interval (float): Seconds between samples
+            history (int): Amount of samples to keep
+
+        """
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.pid = None
+        self._last = None
+        self._stop_event = threading.Event()
+        try:
+            self._ticks = os.sysconf("SC_CLK_TCK")
+            self._page_size = os.sysconf("SC_PAGE_SIZE")
+        except (AttributeError, ValueError, OSError):
+            self._ticks = None
+
+    def watch(self, pid):
+        """Start Sampling Process.
+
+        Args:
+            pid (int): Process ID to sample, replacing the one sampled before (such as after a restart)
+
+        """
+        self.pid = pid
+        self._last = None
+
+    def sample(self):
+        """Take Sample.
+
+        Returns:
+            tuple: The sample added to samples, or None if the process couldn't be read
+
+        """
+        pid = self.pid
+        if pid is None or self._ticks is None:
+            return None
+        try:
+            with open("/proc/{}/stat".format(pid)) as f:
+                fields = f.read().rsplit(")", 1)[1].split()  # The name before ")" may have spaces
+            with open("/proc/{}/statm".format(pid)) as f:
+                rss = int(f.read().split()[1]) * self._page_size
+        except (OSError, IndexError, ValueError):
+            return None
+        now = monotonic()
+        cpu_time = (int(fields[11]) + int(fields[12])) / self._ticks  # utime and stime
+        last, self._last = self._last, (now, cpu_time, pid)
+        if last is None or last[2] != pid:
+            return None
+        sample = (now, (cpu_time - last[1]) / max(now - last[0], 1e-6) * 100, rss)
+        self.samples.append(sample)
+        return sample
+
+    def run(self):
+        while not self._stop_event.wait(self.interval if self._last is not None else 0.1):
+            self.sample()
+
+    def stats(self):
+        """Get Resource Stats.
+
+        Returns:
+            dict: Latest and average CPU percent, and latest and peak RSS in megabytes,
+                or None if there are no samples yet
+
+        """
+        samples = list(self.samples)
+        if not samples:
+            return None
+        return {
+            "cpu": samples[-1][1],
+            "cpu_avg": sum(s[1] for s in samples) / len(samples),
+            "rss_mb": samples[-1][2] / 1048576,
+            "rss_peak_mb": max(s[2] for s in samples) / 1048576
+        }
+
+    def stop(self):
+        """Stop Sampling."""
+        self._stop_event.set()
+
+
+class ScrcpySupervisor:
+    """scrcpy Supervisor.
+
+    Runs scrcpy as a child process, streaming its output line by line as it comes, and starts it
+    again with backoff if it crashes (such as when a USB glitch drops the device). A clean exit
+    (the user closing scrcpy) is never restarted, and neither is anything after stop().
+
+    Attributes:
+        process (subprocess.Popen): Currently running scrcpy process, if any
+        restarts (int): Amount of times scrcpy has been restarted
+
+    """
+
+    def __init__(self, command, max_restarts=5, restart_window=60, on_line=None, device=None, before_restart=None,
+                 policy=None, sampler=None):
+        """
+        Args:
+            command (list): scrcpy command from build_command()
+            max_restarts (int): Most restarts allowed within restart_window seconds before giving up
+            restart_window (float): Seconds a restart counts against max_restarts for
+            on_line (function): Called with the stream name ("stdout" or "stderr") and each line scrcpy
+                outputs, from a reader thread. Prints the line if None.
+            device (str): Device serial to label trace events with, if known
+            before_restart (function): Called before restarting scrcpy after a crash, such as to wait for
+                the device to come back. Returning False gives up instead of restarting.
+            policy (ResourcePolicy): Resource policy to apply to each scrcpy process, if any
+            sampler (ResourceSampler): Running sampler to point at each scrcpy process, if any
+
+        """
+        self.command = command
+        self.device = device
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.on_line = on_line or (lambda stream, line: print(line))
+        self.before_restart = before_restart
+        self.policy = policy
+        self.sampler = sampler
+        self.process = None
+        self.restarts = 0
+        self._restart_requested = False
+        self._restart_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._trace_lock = threading.Lock()
+        self._seen_output = False
+        self._seen_frame = False
+
+    def _read(self, stream_name, stream):
+        for line in stream:
+            line = line.rstrip("\r\n")
+            with self._trace_lock:
+                if not self._seen_output:
+                    self._seen_output = True
+                    tracer.mark("scrcpy-first-output", device=self.device, restart=self.restarts)
+                if not self._seen_frame and any(marker in line for marker in first_frame_markers):
+                    self._seen_frame = True
+                    tracer.mark("first-frame", device=self.device, restart=self.restarts)
+            self.on_line(stream_name, line)
+        stream.close()
+
+    def _spawn(self):
+        command = self.command if self.policy is None else self.policy.wrap(self.command)
+        print("Running command: " + " ".join(command))
+        self._seen_output = False
+        self._seen_frame = False
+        with tracer.span("scrcpy-spawn", device=self.device, restart=self.restarts):
+            self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                            bufsize=1, universal_newlines=True)
+            if self.policy is not None:
+                self.policy.apply(self.process.pid)
+        if self.sampler is not None:
+            self.sampler.watch(self.process.pid)
+        readers = [threading.Thread(target=self._read, args=(name, stream), daemon=True)
+                   for name, stream in (("stdout", self.process.stdout), ("stderr", self.process.stderr))]
+        for reader in readers:
+            reader.start()
+        code = self.process.wait()
+        for reader in readers:
+            reader.join()
+        if self.policy is not None:
+            self.policy.release(self.process.pid)
+        return code
+
+    def _forward_signal(self, signum, frame):
+        print("Stopping scrcpy...")
+        self.stop(signum)
+
+    def run(self):
+        """Run scrcpy Until It Exits for Good.
+
+        Returns:
+            int: scrcpy's exit code (128 + the signal number if it was killed by a signal)
+
+        """
+        handled = []
+        if threading.current_thread() is threading.main_thread():
+            for name in ("SIGINT", "SIGTERM", "SIGHUP"):
+                if hasattr(signal, name):
+                    signum = getattr(signal, name)
+                    handled.append((signum, signal.signal(signum, self._forward_signal)))
+        try:
+            delays = backoff(0.1, 1.0)
+            restart_times = []
+            while True:
+                started = monotonic()
+                code = self._spawn()
+                with self._restart_lock:
+                    restart_requested, self._restart_requested = self._restart_requested, False
+                if self._stop_event.is_set():
+                    break
+                if restart_requested:  # Checked first, since scrcpy quits cleanly (exit code 0) on SIGTERM
+                    self.restarts += 1
+                    continue
+                if code == 0:
+                    break
+                now = monotonic()
+                if now - started > self.restart_window:
+                    delays = backoff(0.1, 1.0)  # It ran fine for a while, so start over with quick restarts
+                restart_times = [t for t in restart_times if now - t < self.restart_window]
+                if len(restart_times) >= self.max_restarts:
+                    print("scrcpy crashed {} times in {} seconds! Giving up...".format(len(restart_times) + 1, self.restart_window))
+                    break
+                restart_times.append(now)
+                if self.before_restart is not None and not self.before_restart():
+                    print("scrcpy exited with code {} and can't be restarted! Giving up...".format(code))
+                    break
+                delay = next(delays)
+                print("scrcpy exited with code {}! Restarting in {:.1f}s...".format(code, delay))
+                if self._stop_event.wait(delay):
+                    break
+                self.restarts += 1
+        finally:
+            for signum, handler in handled:
+                signal.signal(signum, handler)
+        return 128 - code if code < 0 else code
+
+    def restart(self):
+        """Restart scrcpy Now.
+
+        Used when its connection to the device came back, since it's stuck or gone by then.
+        Doesn't count against max_restarts, and does nothing if scrcpy isn't running.
+
+        """
+        with self._restart_lock:
+            process = self.process
+            if process is None or process.poll() is not None or self._stop_event.is_set():
+                return
+            self._restart_requested = True
+        print("Restarting scrcpy...")
+        process.terminate()
+
+    def stop(self, signum=signal.SIGTERM):
+        """Stop scrcpy Without Restarting It.
+
+        Args:
+            signum (int): Signal to send to scrcpy
+
+        """
+        self._stop_event.set()
+        process = self.process
+        if process is not None and process.poll() is None:
+            if os.name == "nt":
+                process.terminate()
+            else:
+                process.send_signal(signum)
+
+
+def target_serial(values):
+    """Get Serial of Device to Mirror.
+
+    Args:
+        values (dict): Dictionary from user selected options
+
+    Returns:
+        str: Serial scrcpy will mirror, or None if it can't be told (such as with several devices connected)
+
+    """
+    if values["wifi_mode"]:
+        return "{}:{}".format(values["addr"], get_port(values))
+    if values["use_sn"] and values["sn"] != "":
+        return values["sn"]
+    return connected_serial()
+
+
+def parse_display_size(output):
+    """Parse Display Size.
+
+    Args:
+        output (str): Output of "wm size" on the device
+
+    Returns:
+        tuple: Width and height in pixels, or None if the output doesn't have them
+
+    """
+    size = None
+    for line in output.splitlines():
+        if "size:" in line:  # "Physical size: 1080x2340", followed by "Override size: ..." if one is set
+            try:
+                width, height = line.split(":")[1].strip().split("x")
+                size = (int(width), int(height))
+            except ValueError:
+                pass
+    return size
+
+
+scrcpy_min_sdk = 21  # scrcpy-server needs Android 5.0
+max_fps_min_sdk = 29  # --max-fps is only supported on Android 10 and up
+probe_separator = "--scrcpy-gui--"
+probe_command = "; echo {0}; ".format(probe_separator).join([
+    "wm size",
+    "getprop ro.build.version.sdk",
+    "getprop ro.build.version.release",
+    "dumpsys display | grep -m 1 -oE '(fps|mRefreshRate)=[0-9.]+'",
+    "cat /vendor/etc/media_codecs*.xml /system/etc/media_codecs*.xml 2>/dev/null | grep -oE '<MediaCodec [^>]*name=\"[^\"]+\"'"
+])
+
+
+def probe_capabilities(serial):
+    """Probe Device Capabilities.
+
+    Everything is asked for in a single adb shell command, so probing costs one round trip.
+
+    Args:
+        serial (str): Serial of device
+
+    Returns:
+        dict: "size" (width and height, or None), "sdk" (API level, or None), "release" (Android
+            version), "refresh_rate" (or None), "encoders" (names of the device's H.264 encoders) and
+            "compatible" (whether scrcpy-server can run on it)
+
+    """
+    sections = adb_client.shell(probe_command, serial).split(probe_separator)
+    sections += [""] * (5 - len(sections))
+    size = parse_display_size(sections[0])
+    try:
+        sdk = int(sections[1].strip())
+    except ValueError:
+        sdk = None
+    try:
+        refresh_rate = float(sections[3].strip().split("=")[1])
+    except (IndexError, ValueError):
+        refresh_rate = None
+    encoders = []
+    for line in sections[4].splitlines():
+        name = line.split('name="')[-1].rstrip('"')
+        if "encoder" in name.lower() and ("avc" in name.lower() or "h264" in name.lower()) and name not in encoders:
+            encoders.append(name)
+    return {
+        "size": list(size) if size is not None else None,
+        "sdk": sdk,
+        "release": sections[2].strip(),
+        "refresh_rate": refresh_rate,
+        "encoders": encoders,
+        "compatible": sdk is None or sdk >= scrcpy_min_sdk
+    }
+
+
+def device_capabilities(serial, ttl=86400, refresh=False):
+    """Get Device Capabilities.
+
+    Probed results are cached per serial in cache_dir()/devices.json, and only probed again once
+    they're older than ttl.
+
+    Args:
+        serial (str): Serial of device
+        ttl (float): Seconds cached capabilities stay valid
+        refresh (bool): Probe again even if cached capabilities are still valid
+
+    Returns:
+        dict: Capabilities from probe_capabilities()
+
+    Raises:
+        OSError: If the adb server can't be reached
+        CommandExecutionError: If adb can't reach the device
+
+    """
+    cache_file = os.path.join(cache_dir(), "devices.json")
+    try:
+        with open(cache_file) as f:
+            entry = json.load(f).get(serial)
+    except (OSError, ValueError):
+        entry = None
+    if entry is not None and not refresh and time.time() - entry["time"] < ttl:
+        return entry["capabilities"]
+    with tracer.span("probe-device", device=serial):
+        capabilities = probe_capabilities(serial)
+    print("{} runs Android {} with a {} display".format(serial, capabilities["release"] or "?",
+                                                       "x".join(str(n) for n in capabilities["size"] or ["?"])))
+    update_cache(cache_file, serial, {"time": time.time(), "capabilities": capabilities})
+    return capabilities
+
+
+def cached_capabilities(serial, ttl=86400):
+    """Get Cached Device Capabilities Without Probing.
+
+    Args:
+        serial (str): Serial of device
+        ttl (float): Seconds cached capabilities stay valid
+
+    Returns:
+        dict: Capabilities from probe_capabilities(), or None if none are cached (or they're too old)
+
+    """
+    try:
+        with open(os.path.join(cache_dir(), "devices.json")) as f:
+            entry = json.load(f).get(serial)
+    except (OSError, ValueError):
+        return None
+    if entry is None or time.time() - entry["time"] >= ttl:
+        return None
+    return entry["capabilities"]
+
+
+def prefill_options(values, capabilities):
+    """Prefill Options From Device Capabilities.
+
+    Fills empty resolution and framerate fields with what the device's display does, without
+    turning the options on.
+
+    Args:
+        values (dict): Dictionary from user selected options. Updated in place.
+        capabilities (dict): Capabilities from device_capabilities()
+
+    Returns:
+        dict: The values that were filled in
+
+    """
+    filled = {}
+    if values["resolution"] == "" and capabilities["size"]:
+        filled["resolution"] = str(max(capabilities["size"]))
+    if values["framerate"] == "" and capabilities["refresh_rate"]:
+        filled["framerate"] = str(int(round(capabilities["refresh_rate"])))
+    values.update(filled)
+    return filled
+
+
+def check_options(values, capabilities=None):
+    """Check Options Can Work.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        capabilities (dict): Capabilities of the device from device_capabilities(), if known
+
+    Raises:
+        ValueError: If an option is malformed or the device can't honor it
+
+    """
+    capabilities = capabilities or {}
+    sdk = capabilities.get("sdk")
+    if not capabilities.get("compatible", True):
+        raise ValueError("scrcpy needs Android 5.0 or newer, but this device runs Android {}!".format(capabilities["release"]))
+    if values["use_resolution"] and values["resolution"] != "":
+        try:
+            resolution = int(values["resolution"])
+        except ValueError:
+            raise ValueError("Resolution must be a number!")
+        if resolution <= 0:
+            raise ValueError("Resolution must be more than 0!")
+        if capabilities.get("size") and resolution > max(capabilities["size"]):
+            raise ValueError("Resolution can't be more than your device's display ({})!".format(
+                "x".join(str(n) for n in capabilities["size"])))
+    if values["use_bitrate"] and values["bitrate"] != "":
+        bitrate = values["bitrate"]
+        if not (bitrate.isdigit() or (bitrate[:-1].isdigit() and bitrate[-1] in "KkMm")):
+            raise ValueError("Bitrate must be a number, optionally followed by K or M (such as 8M)!")
+    if values["use_framerate"] and values["framerate"] != "":
+        try:
+            framerate = int(values["framerate"])
+        except ValueError:
+            raise ValueError("Framerate must be a number!")
+        if framerate <= 0:
+            raise ValueError("Framerate must be more than 0!")
+        if sdk is not None and sdk < max_fps_min_sdk:
+            print("Limiting the framerate is only supported on Android 10 and newer, so it may not work on Android {}.".format(capabilities["release"]))
+        if capabilities.get("refresh_rate") and framerate > round(capabilities["refresh_rate"]):
+            raise ValueError("Framerate can't be more than your device's display does ({:g} fps)!".format(capabilities["refresh_rate"]))
+    if values["set_orien"] and values["orien"] not in rotation_options:
+        raise ValueError("Pick an orientation to lock to!")
+    if capabilities.get("sdk") is not None and not capabilities.get("encoders"):
+        print("Couldn't find an H.264 encoder on the device! scrcpy may fail to start.")
+
+
+def check_device_options(values, serial, refresh=False):
+    """Check Options Against Device.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        serial (str): Serial of device, or None if it isn't known (only the options' format is checked)
+        refresh (bool): Probe the device again even if its capabilities are cached
+
+    Raises:
+        ValueError: If an option is malformed or the device can't honor it
+
+    """
+    capabilities = None
+    if serial is not None:
+        try:
+            capabilities = device_capabilities(serial, refresh=refresh)
+        except (OSError, CommandExecutionError) as e:
+            print("Couldn't probe {} ({})! Only checking the options themselves...".format(serial, e))
+    check_options(values, capabilities)
+
+
+def probe_link(serial, probe_bytes=1048576):
+    """Probe Link to Device.
+
+    Args:
+        serial (str): Serial of device
+        probe_bytes (int): Bytes to pull from the device to measure throughput
+
+    Returns:
+        dict: "rtt" (seconds for an adb round trip) and "throughput" (bits per second)
+
+    """
+    rtts = []
+    for _ in range(3):
+        start = monotonic()
+        adb_client.shell("echo", serial)
+        rtts.append(monotonic() - start)
+    start = monotonic()
+    data = adb_client.service("exec:head -c {} /dev/zero".format(probe_bytes), serial)
+    elapsed = max(monotonic() - start - min(rtts), 0.001)
+    return {"rtt": sorted(rtts)[1], "throughput": len(data) * 8 / elapsed}
+
+
+def pick_settings(link, capabilities, target_latency=0.1):
+    """Pick scrcpy Settings for Link.
+
+    Args:
+        link (dict): Link measurements from probe_link()
+        capabilities (dict): Device capabilities from device_capabilities()
+        target_latency (float): Seconds of latency to aim for
+
+    Returns:
+        dict: "bitrate", "resolution" and "framerate" as scrcpy options
+
+    """
+    bitrate = max(1, min(16, int(link["throughput"] * 0.5 / 1000000)))  # Leave half the link free for adb and control
+    if bitrate >= 8:
+        resolution = 1920
+    elif bitrate >= 4:
+        resolution = 1280
+    elif bitrate >= 2:
+        resolution = 1024
+    else:
+        resolution = 800
+    if capabilities["size"] is not None:
+        resolution = min(resolution, max(capabilities["size"]))
+    framerate = 60 if link["rtt"] < target_latency / 2 and bitrate >= 2 else 30
+    if capabilities.get("refresh_rate"):
+        framerate = min(framerate, round(capabilities["refresh_rate"]))  # check_options() rejects anything higher
+    return {"bitrate": "{}M".format(bitrate), "resolution": str(resolution), "framerate": str(framerate)}
+
+
+def auto_tune(serial, retune=False):
+    """Auto-Tune scrcpy Settings.
+
+    Probes the link to the device and its display, and picks settings that keep latency down.
+    Results are cached per serial and link type, so the probe only runs once.
+
+    Args:
+        serial (str): Serial of device
+        retune (bool): Probe again even if settings are cached
+
+    Returns:
+        dict: Settings from pick_settings()
+
+    """
+    link_type = "wifi" if ":" in serial else "usb"
+    cache_file = os.path.join(cache_dir(), "tuning.json")
+    key = "{}|{}".format(serial, link_type)
+    try:
+        with open(cache_file) as f:
+            tuned = json.load(f).get(key)
+    except (OSError, ValueError):
+        tuned = None
+    if tuned is not None and not retune:
+        return tuned
+    print("Probing {} link to {}...".format(link_type, serial))
+    link = probe_link(serial)
+    tuned = pick_settings(link, device_capabilities(serial, refresh=retune))
+    print("Measured {:.1f}ms round trip and {:.1f} Mbit/s, picked {}".format(link["rtt"] * 1000, link["throughput"] / 1000000, tuned))
+    update_cache(cache_file, key, tuned)
+    return tuned
+
+
+def apply_auto_tune(values, serial, retune=False):
+    """Apply Auto-Tuned Settings.
+
+    Fills in bitrate, resolution and framerate from auto_tune() if auto-tuning is on.
+    Options the user set themselves are left alone.
+
+    Args:
+        values (dict): Dictionary from user selected options. Updated in place.
+        serial (str): Serial of device, or None if it isn't known
+        retune (bool): Probe again even if settings are cached
+
+    """
+    if not values["auto_tune"]:
+        return
+    if serial is None:
+        print("Can't tell which device to auto-tune for! Using your settings...")
+        return
+    try:
+        with tracer.span("auto-tune", device=serial):
+            tuned = auto_tune(serial, retune)
+    except (OSError, CommandExecutionError) as e:
+        print("Auto-tuning failed ({})! Using your settings...".format(e))
+        return
+    for option in ("bitrate", "resolution", "framerate"):
+        if not values["use_" + option] or values[option] == "":
+            values["use_" + option] = True
+            values[option] = tuned[option]
+
+
+class DeviceWarmer:
+    """Device Warmer.
+
+    Gets a device ready in the background while the user is still picking options, so pressing
+    Start finds everything cached: connects to it over Wi-Fi if it's already listening, opens its
+    transport in the adb server, probes its capabilities and, if auto-tuning is on, tunes for it.
+    Warming up another device (or the same one in another mode) drops whatever was warmed before.
+
+    """
+
+    def __init__(self, on_ready=None):
+        """
+        Args:
+            on_ready (function): Called with the key and state (see finish()) once a warm-up is done,
+                from the warm-up thread. Not called for warm-ups that were dropped.
+
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        self.on_ready = on_ready
+        self.key = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=1)
+
+    @staticmethod
+    def make_key(serial, wifi, tune):
+        """Make Warm-Up Key.
+
+        Args:
+            serial (str): Serial of the device, "ip:port" in Wi-Fi mode. None if there's no device to warm
+            wifi (bool): Whether the device is used over Wi-Fi
+            tune (bool): Whether auto-tuning is on
+
+        Returns:
+            tuple: Key for warm() and finish(), or None if serial is None
+
+        """
+        return None if serial is None else (serial, bool(wifi), bool(tune))
+
+    def warm(self, key):
+        """Start Warming Up.
+
+        Does nothing if key is already being (or was successfully) warmed up, and drops the last
+        warm-up otherwise. A failed warm-up of key (such as before USB debugging was allowed) is retried.
+
+        Args:
+            key (tuple): Key from make_key(). None to only drop the last warm-up
+
+        """
+        if key == self.key and not (self.future is not None and self.future.done() and self.future.result() is None):
+            return
+        self._cancel.set()
+        self._cancel = threading.Event()
+        self.key = key
+        self.future = self._pool.submit(self._warm, key, self._cancel) if key is not None else None
+
+    def _warm(self, key, cancel):
+        serial, wifi, tune = key
+        state = {"connected": False}
+        try:
+            with tracer.span("warm-up", device=serial):
+                if wifi:
+                    addr, port = serial.rsplit(":", 1)
+                    if not wait_for_port(addr, int(port), monotonic() + 1) or cancel.is_set():
+                        return None  # Not listening yet, so it'll be switched to TCP mode over USB on start
+                    state["connected"] = adb_client.connect(serial).startswith(("connected to", "already connected to"))
+                    if not state["connected"]:
+                        return None
+                adb_client.shell("echo", serial)  # Has the server open the device's transport
+                if cancel.is_set():
+                    return None
+                state["capabilities"] = device_capabilities(serial)
+                if tune and not cancel.is_set():
+                    state["tuned"] = auto_tune(serial)
+        except (OSError, ValueError, CommandExecutionError) as e:
+            print("Couldn't warm up {} ({})".format(serial, e))
+            return None
+        if cancel.is_set():
+            return None
+        print("{} is ready".format(serial))
+        if self.on_ready is not None:
+            self.on_ready(key, state)
+        return state
+
+    def finish(self, key, timeout=10):
+        """Finish Warm-Up.
+
+        Waits for the warm-up of key if it's still going, and stops warming up anything else.
+
+        Args:
+            key (tuple): Key from make_key()
+            timeout (float): Most seconds to wait
+
+        Returns:
+            dict: "connected" (whether it was connected to over Wi-Fi), "capabilities" and "tuned"
+                (if auto-tuning), or None if key wasn't warmed up
+
+        """
+        state = None
+        if key is not None and key == self.key:
+            try:
+                state = self.future.result(timeout)
+            except Exception:  # Timed out, or failed in a way _warm() didn't expect
+                pass
+        self.warm(None)
+        self._pool.shutdown(wait=False)
+        return state
+
+
+class SegmentRecorder:
+    """Segment Recorder.
+
+    Records the mirrored stream in segments. scrcpy records into a named pipe, which ffmpeg's segment
+    muxer cuts into segments of a set length, so the mirror session never has to stop for a new
+    segment and a crash only loses the segment being written. Finished segments are handed to a
+    pool of workers that remux them to MP4 (or compress them), add them to index.jsonl in the
+    recording folder, and delete the oldest segments once the folder holds too much.
+
+    Without named pipes (Windows) or ffmpeg, scrcpy records into a single file instead, which is
+    still post-processed when the session ends.
+
+    """
+
+    def __init__(self, directory, segment_seconds=300, segment_mb=None, bitrate_mbps=8, max_bytes=None,
+                 compress=False, workers=2, ffmpeg=None):
+        """
+        Args:
+            directory (str): Folder to record into
+            segment_seconds (int): Length of each segment
+            segment_mb (int): Size to aim for per segment, if segments should be cut by size instead. ffmpeg
+                can only cut on time, so this is turned into a length using the bitrate.
+            bitrate_mbps (float): Bitrate scrcpy records with, in megabits per second
+            max_bytes (int): Most bytes of finished segments to keep. None to keep everything
+            compress (bool): Re-encode segments to save space, instead of only remuxing them
+            workers (int): Segments to post-process at once
+            ffmpeg (str): ffmpeg executable. Defaults to $SCRCPY_GUI_FFMPEG, then ffmpeg on the PATH
+
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        if segment_mb:
+            self.segment_seconds = max(1, int(segment_mb * 8 / bitrate_mbps))
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.ffmpeg = ffmpeg or os.environ.get("SCRCPY_GUI_FFMPEG") or which("ffmpeg")
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.segmented = self.ffmpeg is not None and hasattr(os, "mkfifo")
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.prefix = "scrcpy-" + stamp
+        self.pipe = os.path.join(directory, ".{}.pipe".format(self.prefix))
+        self.single_file = os.path.join(directory, self.prefix + ".mkv")
+        self.index_file = os.path.join(directory, "index.jsonl")
+        self._finished = []  # (path, size) of post-processed segments, oldest first
+        self._list_files = []  # Segment list of each ffmpeg run, since each run writes its own from scratch
+        self._listed = {}  # List file -> amount of its segments already handed to the pool
+        self._ffmpeg = None
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def scrcpy_args(self):
+        """Get scrcpy Arguments.
+
+        Returns:
+            list: Arguments to add to the scrcpy command to record
+
+        """
+        return ["--record", self.pipe if self.segmented else self.single_file, "--record-format", "mkv"]
+
+    def start(self):
+        """Start Recording. Must be called before scrcpy starts."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._finished = self._existing_segments()
+        if not self.segmented:
+            print("Recording to {} (segmenting needs ffmpeg and named pipes)".format(self.single_file))
+            return
+        os.mkfifo(self.pipe)
+        print("Recording to {} in {} second segments".format(self.directory, self.segment_seconds))
+        for target in (self._segment, self._watch):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _existing_segments(self):
+        """Get Segments Already in the Folder.
+
+        Returns:
+            list: (path, size) of recordings left by earlier sessions, oldest first (their names start
+                with the time they were recorded), so retention counts them too
+
+        """
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.startswith("scrcpy-") and name.endswith((".mp4", ".mkv")) and os.path.isfile(path):
+                segments.append((path, os.path.getsize(path)))
+        return segments
+
+    def _segment(self):
+        run_number = 0
+        while not self._stop_event.is_set():  # scrcpy restarting closes the pipe, so ffmpeg needs restarting too
+            pattern = os.path.join(self.directory, "{}-{:03d}-%05d.mkv".format(self.prefix, run_number))
+            list_file = os.path.join(self.directory, ".{}-{:03d}.csv".format(self.prefix, run_number))
+            with self._lock:
+                self._list_files.append(list_file)
+            self._ffmpeg = subprocess.Popen([self.ffmpeg, "-loglevel", "error", "-y", "-f", "matroska", "-i", self.pipe,
+                                             "-c", "copy", "-f", "segment", "-segment_time", str(self.segment_seconds),
+                                             "-segment_format", "matroska", "-reset_timestamps", "1",
+                                             "-segment_list", list_file, "-segment_list_type", "csv",
+                                             "-segment_list_flags", "+live", "-segment_list_size", "0", pattern],
+                                            stdin=subprocess.DEVNULL)
+            self._ffmpeg.wait()
+            run_number += 1
+
+    def _watch(self):
+        while not self._stop_event.wait(0.5):
+            self._collect()
+
+    def _collect(self):
+        with self._lock:
+            list_files = list(self._list_files)
+        for list_file in list_files:
+            try:
+                with open(list_file) as f:
+                    lines = f.read().splitlines()
+            except OSError:
+                continue
+            with self._lock:
+                listed = self._listed.get(list_file, 0)
+                new, self._listed[list_file] = lines[listed:], max(listed, len(lines))
+            for line in new:
+                name, start, end = line.rsplit(",", 2)
+                self.pool.submit(self._process, os.path.join(self.directory, name), float(start), float(end))
+
+    def _process(self, path, start=None, end=None):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if size == 0:
+            os.remove(path)
+            return
+        output = path
+        if self.ffmpeg is not None:
+            output = os.path.splitext(path)[0] + ".mp4"
+            codec = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "28"] if self.compress else ["-c", "copy"]
+            code = call([self.ffmpeg, "-loglevel", "error", "-y", "-i", path] + codec + ["-movflags", "+faststart", output],
+                        stdin=subprocess.DEVNULL)
+            if code == 0:
+                os.remove(path)
+            else:
+                print("Failed to post-process {}! Keeping it as is.".format(path))
+                output = path
+        entry = {"file": os.path.basename(output), "start": start, "end": end,
+                 "bytes": os.path.getsize(output), "finished": time.time()}
+        with self._lock:
+            with open(self.index_file, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._finished.append((output, entry["bytes"]))
+            self._finished.sort()  # Segments can finish post-processing out of order, but their names sort by age
+            self._enforce_retention()
+
+    def _enforce_retention(self):
+        if self.max_bytes is None:
+            return
+        total = sum(size for _, size in self._finished)
+        while total > self.max_bytes and len(self._finished) > 1:
+            path, size = self._finished.pop(0)
+            try:
+                os.remove(path)
+                print("Deleted old segment {}".format(path))
+            except OSError:
+                pass
+            total -= size
+
+    def stop(self):
+        """Stop Recording.
+
+        Call once scrcpy has exited. Waits for the last segments to be post-processed.
+
+        """
+        self._stop_event.set()
+        if self.segmented:
+            try:  # Let ffmpeg see the end of the pipe if scrcpy never opened it
+                os.close(os.open(self.pipe, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+            ffmpeg = self._ffmpeg
+            if ffmpeg is not None:
+                try:
+                    ffmpeg.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    ffmpeg.terminate()
+            for thread in self._threads:
+                thread.join()
+            self._collect()  # Only now that ffmpeg is done can its last segments be listed
+            for path in [self.pipe] + self._list_files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        elif os.path.isfile(self.single_file):
+            self.pool.submit(self._process, self.single_file)
+        self.pool.shutdown(wait=True)
+
+
+def start_recording(values):
+    """Start Recording If Enabled.
+
+    Args:
+        values (dict): Dictionary from user selected options
+
+    Returns:
+        SegmentRecorder: Started recorder, or None if recording is off
+
+    """
+    if not values["record"]:
+        return None
+
+    def number(key, default=None):
+        try:
+            return float(values[key]) if values[key] != "" else default
+        except ValueError:
+            print("Ignoring {} because it isn't a number!".format(key))
+            return default
+
+    bitrate = values["bitrate"] if values["use_bitrate"] else ""
+    try:
+        bitrate_mbps = float(bitrate[:-1]) if bitrate.upper().endswith("M") else float(bitrate) / 1000000
+    except ValueError:
+        bitrate_mbps = 8  # scrcpy's default
+    max_mb = number("record_max_mb")
+    recorder = SegmentRecorder(full(values["record_dir"] or "~/scrcpy-recordings"),
+                               segment_seconds=int(number("segment_seconds", 300)),
+                               segment_mb=number("segment_mb"), bitrate_mbps=bitrate_mbps,
+                               max_bytes=int(max_mb * 1048576) if max_mb else None, compress=values["record_compress"])
+    recorder.start()
+    return recorder
+
+
+fps_pattern = re.compile(r"\b(\d+) fps(?: \(\+(\d+) frames? skipped\))?")  # "60 fps (+3 frames skipped)"
+
+
+class SessionMetrics:
+    """Mirroring Session Metrics.
+
+    Keeps the latest frame rates scrcpy reported (scrcpy prints them once a second while its FPS
+    counter is on, toggled with Ctrl+i), along with the session's supervisor, resource sampler and
+    Wi-Fi monitor to read their numbers from.
+
+    Attributes:
+        frames (collections.deque): Latest reports, as (time.monotonic(), fps, frames skipped)
+        skipped_total (int): Frames skipped over the whole session
+
+    """
+
+    def __init__(self, device=None, history=120):
+        """
+        Args:
+            device (str): Serial of the device being mirrored, if known
+            history (int): Amount of frame rate reports to keep
+
+        """
+        self.device = device or "default"
+        self.frames = deque(maxlen=history)
+        self.skipped_total = 0
+        self.supervisor = None
+        self.sampler = None
+        self.monitor = None
+        self.lock = threading.Lock()
+
+    def feed(self, line):
+        """Read Line of scrcpy Output.
+
+        Args:
+            line (str): Line scrcpy output
+
+        Returns:
+            bool: Whether it was a frame rate report
+
+        """
+        match = fps_pattern.search(line)
+        if match is None:
+            return False
+        skipped = int(match.group(2) or 0)
+        with self.lock:
+            self.frames.append((monotonic(), int(match.group(1)), skipped))
+            self.skipped_total += skipped
+        return True
+
+    def rolling_fps(self, seconds=10):
+        """Get Rolling Frame Rate.
+
+        Args:
+            seconds (float): Seconds of reports to average
+
+        Returns:
+            float: Average frame rate over the last seconds, or None if there were no reports then
+
+        """
+        now = monotonic()
+        with self.lock:
+            recent = [fps for when, fps, _ in self.frames if now - when <= seconds]
+        return sum(recent) / len(recent) if recent else None
+
+    def snapshot(self):
+        """Get Current Metrics.
+
+        Returns:
+            dict: "fps" and "skipped" (from the latest report in the last 5 seconds, or None),
+                "fps_avg" (rolling_fps()), "skipped_total", "restarts", and "cpu", "rss_mb",
+                "latency_ms" and "reconnects" when they're being measured (None otherwise)
+
+        """
+        with self.lock:
+            latest = self.frames[-1] if self.frames else None
+            skipped_total = self.skipped_total
+        if latest is not None and monotonic() - latest[0] > 5:
+            latest = None  # The counter was turned off, or scrcpy stalled
+        usage = self.sampler.stats() if self.sampler is not None else None
+        link = self.monitor.stats() if self.monitor is not None else None
+        return {
+            "fps": latest[1] if latest is not None else None,
+            "skipped": latest[2] if latest is not None else None,
+            "fps_avg": self.rolling_fps(),
+            "skipped_total": skipped_total,
+            "restarts": self.supervisor.restarts if self.supervisor is not None else 0,
+            "cpu": usage["cpu"] if usage is not None else None,
+            "rss_mb": usage["rss_mb"] if usage is not None else None,
+            "latency_ms": link["latency"] if link is not None else None,
+            "reconnects": link["reconnects"] if link is not None else None
+        }
+
+
+class MetricsRegistry:
+    """Metrics of Running Sessions.
+
+    Sessions are added while they run, and can be served in Prometheus' text format with serve().
+
+    """
+
+    # Metric name -> (snapshot key, type, help, multiplier)
+    metrics = {
+        "scrcpy_fps": ("fps", "gauge", "Frames per second in scrcpy's latest report", 1),
+        "scrcpy_fps_avg": ("fps_avg", "gauge", "Frames per second averaged over the last 10 seconds", 1),
+        "scrcpy_frames_skipped": ("skipped", "gauge", "Frames skipped in scrcpy's latest report", 1),
+        "scrcpy_frames_skipped_total": ("skipped_total", "counter", "Frames skipped over the session", 1),
+        "scrcpy_restarts_total": ("restarts", "counter", "Times scrcpy was restarted", 1),
+        "scrcpy_cpu_percent": ("cpu", "gauge", "CPU used by scrcpy, in percent of one CPU", 1),
+        "scrcpy_rss_bytes": ("rss_mb", "gauge", "Resident memory of scrcpy", 1048576),
+        "scrcpy_adb_latency_seconds": ("latency_ms", "gauge", "Round trip time of adb pings over Wi-Fi", 0.001),
+        "scrcpy_wifi_reconnects_total": ("reconnects", "counter", "Times the Wi-Fi connection was brought back", 1)
+    }
+
+    def __init__(self):
+        self._sessions = []
+        self._lock = threading.Lock()
+        self.server = None
+
+    def add(self, session):
+        with self._lock:
+            self._sessions.append(session)
+
+    def remove(self, session):
+        with self._lock:
+            self._sessions.remove(session)
+
+    def sessions(self):
+        """Get Running Sessions.
+
+        Returns:
+            list: SessionMetrics of every running session
+
+        """
+        with self._lock:
+            return list(self._sessions)
+
+    def render(self):
+        """Render Metrics.
+
+        Returns:
+            str: Metrics of every running session in Prometheus' text format. Metrics that aren't
+                measured for a session are left out for it.
+
+        """
+        snapshots = [(session.device, session.snapshot()) for session in self.sessions()]
+        lines = []
+        for name, (key, kind, description, multiplier) in self.metrics.items():
+            lines.append("# HELP {} {}".format(name, description))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for device, snapshot in snapshots:
+                if snapshot[key] is not None:
+                    label = device.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                    value = snapshot[key] * multiplier
+                    # Counters stay whole numbers, and repr() keeps every digit of the rest (unlike {:g})
+                    value = str(value) if isinstance(value, int) else repr(float(value))
+                    lines.append('{}{{device="{}"}} {}'.format(name, label, value))
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve Metrics Over HTTP.
+
+        Serves render() at /metrics from a background thread.
+
+        Args:
+            port (int): Port to listen on
+            host (str): Address to listen on. Only this machine by default
+
+        Raises:
+            OSError: If the port can't be listened on
+
+        """
+        import http.server  # Only needed with --metrics-port, so kept out of startup
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.HTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print("Serving metrics on http://{}:{}/metrics".format(host, self.server.server_port))
+
+
+metrics = MetricsRegistry()
+
+
+def run_session(values, command, max_restarts=5, device=None, policy=None):
+    """Run Mirroring Session.
+
+    Runs scrcpy along with everything that runs next to it (such as recording). In Wi-Fi mode a
+    WifiMonitor watches the connection, reconnecting and restarting scrcpy when it drops.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        command (list): scrcpy command from build_command()
+        max_restarts (int): Most times to restart scrcpy after it crashes in a minute
+        device (str): Serial of the device being mirrored, if known
+        policy (ResourcePolicy): Resource policy to run scrcpy with, if any
+
+    Returns:
+        int: Exit code scrcpy gave us
+
+    """
+    recorder = start_recording(values)
+    if recorder is not None:
+        command = command + recorder.scrcpy_args()
+    monitor = None
+    if values["wifi_mode"] and device is not None:
+        monitor = WifiMonitor(device)
+        monitor.start()
+    sampler = ResourceSampler()
+    sampler.start()
+    session = SessionMetrics(device)
+
+    def on_line(stream, line):
+        session.feed(line)
+        print(line)
+    supervisor = ScrcpySupervisor(command, max_restarts=max_restarts, on_line=on_line, device=device,
+                                  before_restart=monitor.wait_healthy if monitor is not None else None,
+                                  policy=policy, sampler=sampler)
+    if monitor is not None:
+        monitor.on_reconnect = supervisor.restart
+    session.supervisor, session.sampler, session.monitor = supervisor, sampler, monitor
+    metrics.add(session)
+    try:
+        return supervisor.run()
+    finally:
+        metrics.remove(session)
+        sampler.stop()
+        usage = sampler.stats()
+        if usage is not None:
+            print("scrcpy used {:.1f}% CPU on average and at most {:.1f}MB of memory".format(usage["cpu_avg"], usage["rss_peak_mb"]))
+        if monitor is not None:
+            monitor.stop()
+            stats = monitor.stats()
+            if stats["median_latency"] is not None:
+                print("Wi-Fi: {:.1f}ms median latency, {} drops, {} reconnects".format(
+                    stats["median_latency"], stats["drops"], stats["reconnects"]))
+        if recorder is not None:
+            print("Finishing recording...")
+            recorder.stop()
+
+
+def launch_from_settings(name=None, max_restarts=5, retune=False, policy=None):
+    """Launch scrcpy Without the GUI.
+
+    Uses the options saved in scrcpy-gui-settings.json, and never imports tkinter or PySimpleGUI.
+    In Wi-Fi mode the device must already be listening for adb over TCP.
+
+    Args:
+        name (str): Profile to use. None for the last one used on the connected device
+        max_restarts (int): Most times to restart scrcpy after it crashes in a minute
+        retune (bool): Probe the device again if auto-tuning is on
+        policy (ResourcePolicy): Resource policy to run scrcpy with, if any
+
+    Returns:
+        int: Exit code to leave scrcpy-gui with
+
+    """
+    tools = find_tools()
+    if tools["adb"] is None or tools["scrcpy"] is None:
+        print("ADB/scrcpy not installed! Run scrcpy-gui without --from-settings to install them.")
+        return 1
+    if name is None:
+        switch_profile(store.profile_for_device(connected_serial()))
+    print("Using profile {}".format(profile))
+    values = values_from_db()
+    if values["wifi_mode"]:
+        if values["addr"] == "":
+            print("IP address not specified!")
+            return 1
+        try:
+            port = get_port(values)
+        except ValueError as e:
+            print(e)
+            return 1
+        try:
+            connect_wifi(tools["adb"], values["addr"], port, switch_to_tcpip=False)
+        except CommandExecutionError as e:
+            print(e)
+            return 1
+    serial = target_serial(values)
+    store.use(profile, serial)
+    apply_auto_tune(values, serial, retune)
+    try:
+        check_device_options(values, serial)
+    except ValueError as e:
+        print(e)
+        return 1
+    return run_session(values, build_command(values, tools["scrcpy"]), max_restarts, serial, policy)
+
+
+def launch_fleet(serials=None, concurrency=4, stagger=0.5, max_restarts=5, policy=None, startup_timeout=20):
+    """Launch scrcpy on Many Devices.
+
+    Mirrors every device at once with the saved settings, without the GUI. Settings can be
+    overridden per device in the current profile's "devices" entry, which maps serial numbers to
+    database values, such as {"devices": {"ABC123": {"use_bitrate": true, "bitrate": "2M"}}}, and
+    are applied on top of the profile last used with that device (or the current profile).
+
+    Args:
+        serials (list): Serial numbers of devices to mirror. All connected devices if empty or None
+        concurrency (int): Most devices to start up at once (probing, tuning and starting scrcpy up to its
+            first frame). Every device is mirrored once started, while the rest wait for a free slot.
+        stagger (float): Least amount of seconds between two devices starting up, so they don't
+            all hit the adb server at the same time
+        max_restarts (int): Most times to restart each scrcpy after it crashes in a minute
+        policy (ResourcePolicy): Resource policy to run each scrcpy with, if any
+        startup_timeout (float): Seconds after which a device that hasn't shown a frame yet gives up its
+            startup slot anyway
+
+    Returns:
+        int: 0 if every scrcpy exited cleanly, 1 otherwise
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    tools = find_tools()
+    if tools["adb"] is None or tools["scrcpy"] is None:
+        print("ADB/scrcpy not installed! Run scrcpy-gui without --fleet to install them.")
+        return 1
+    start_adb_server(tools["adb"])
+    if not serials:
+        serials = [d["serial"] for d in adb_client.devices() if d["state"] == "device"]
+    if not serials:
+        print("No devices connected!")
+        return 1
+    overrides = get_val("devices", {})
+    base = dict(db)
+    start_lock = threading.Lock()
+    last_start = [0.0]
+    startup_slots = threading.Semaphore(max(concurrency, 1))
+
+    def launch(serial):
+        if not startup_slots.acquire(blocking=False):
+            print("[{}] Waiting for another device to finish starting...".format(serial))
+            startup_slots.acquire()
+        released = threading.Event()
+
+        def release_slot():  # Once scrcpy shows its first frame, exits, or takes too long
+            if not released.is_set():
+                released.set()
+                startup_slots.release()
+        start = monotonic()
+        try:
+            with start_lock:
+                sleep(max(last_start[0] + stagger - monotonic(), 0))
+                last_start[0] = monotonic()
+            settings = store.get(store.data["device_profiles"][serial]) if serial in store.data["device_profiles"] else dict(base)
+            settings.update(overrides.get(serial, {}))
+            values = values_from_db(settings)
+            values.update({"usb_mode": True, "wifi_mode": False, "use_sn": True, "sn": serial})
+            apply_auto_tune(values, serial)
+            try:
+                check_device_options(values, serial)
+            except ValueError as e:
+                print("[{}] {}".format(serial, e))
+                return serial, None, 1, monotonic() - start, None
+            command = build_command(values, tools["scrcpy"])
+            startup = []
+            session = SessionMetrics(serial)
+
+            def on_line(stream, line):
+                if not startup and any(marker in line for marker in first_frame_markers):
+                    startup.append(monotonic() - start)
+                    release_slot()
+                session.feed(line)
+                print("[{}] {}".format(serial, line))
+
+            sampler = ResourceSampler()
+            sampler.start()
+            session.sampler = sampler
+            session.supervisor = ScrcpySupervisor(command, max_restarts=max_restarts, on_line=on_line, device=serial,
+                                                  policy=policy, sampler=sampler)
+            metrics.add(session)
+            slot_timer = threading.Timer(startup_timeout, release_slot)
+            slot_timer.daemon = True
+            slot_timer.start()
+            try:
+                code = session.supervisor.run()
+            finally:
+                slot_timer.cancel()
+                metrics.remove(session)
+                sampler.stop()
+            return serial, startup[0] if startup else None, code, monotonic() - start, sampler.stats()
+        finally:
+            release_slot()
+
+    print("Launching scrcpy on {} device(s), starting {} at a time...".format(len(serials), concurrency))
+    with ThreadPoolExecutor(max_workers=len(serials)) as pool:
+        results = list(pool.map(launch, serials))
+    print("{:<24} {:>10} {:>10} {:>6} {:>8} {:>9}".format("Device", "Startup", "Ran for", "Exit", "CPU avg", "RSS peak"))
+    for serial, startup, code, duration, usage in results:
+        startup = "-" if startup is None else "{:.2f}s".format(startup)
+        cpu = "-" if usage is None else "{:.1f}%".format(usage["cpu_avg"])
+        rss = "-" if usage is None else "{:.1f}MB".format(usage["rss_peak_mb"])
+        print("{:<24} {:>10} {:>10} {:>6} {:>8} {:>9}".format(serial, startup, "{:.1f}s".format(duration), code, cpu, rss))
+    return 0 if all(result[2] == 0 for result in results) else 1
+
+
+def selected_serials(values, devices):
+    """Get Serials of Selected Devices.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        devices (list): Connected devices (see AdbClient.devices())
+
+    Returns:
+        list: The device set with the serial number option (or the Wi-Fi one in Wi-Fi mode), or every
+            connected device if there isn't one
+
+    """
+    if values["wifi_mode"] and values["addr"] != "":
+        return [target_serial(values)]
+    if values["usb_mode"] and values["use_sn"] and values["sn"] != "":
+        return [values["sn"]]
+    return [d["serial"] for d in devices if d["state"] == "device"]
+
+
+def capture_screenshot(serial, directory, adb="adb", check=None):
+    """Capture Screenshot.
+
+    The PNG is streamed from "adb exec-out screencap -p" straight to a file in directory, named after
+    the serial and the time.
+
+    Args:
+        serial (str): Serial of device
+        directory (str): Folder to save the screenshot to
+        adb (str): adb executable, only used if the adb server can't be reached
+        check (function): Called before every chunk, such as to raise if the caller gave up
+
+    Returns:
+        dict: "serial", "path", "bytes" and "seconds" the capture took
+
+    Raises:
+        CommandExecutionError: If capturing fails
+
+    """
+    start = monotonic()
+    name = "{}-{}.png".format(re.sub(r"[^A-Za-z0-9._-]", "_", serial), time.strftime("%Y%m%d-%H%M%S"))
+    path = os.path.join(directory, name)
+    tmp_path = path + ".part"
+    try:
+        with open(tmp_path, "wb") as f:
+            try:
+                written = adb_client.stream("exec:screencap -p", f, serial, check)
+            except ConnectionRefusedError:
+                process = subprocess.run([adb, "-s", serial, "exec-out", "screencap", "-p"], stdout=f, stderr=subprocess.PIPE)
+                if process.returncode != 0:
+                    raise CommandExecutionError(process.stderr.decode("utf-8", "replace").strip())
+                written = f.tell()
+        with open(tmp_path, "rb") as f:
+            if f.read(8) != b"\x89PNG\r\n\x1a\n":
+                raise CommandExecutionError("{} didn't send a PNG".format(serial))
+        os.replace(tmp_path, path)
+    except (OSError, CommandExecutionError) as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise CommandExecutionError("Screenshot of {} failed: {}".format(serial, e))
+    except BaseException:  # Such as TaskCancelled
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    seconds = monotonic() - start
+    tracer.record("screenshot", start, device=serial)
+    return {"serial": serial, "path": path, "bytes": written, "seconds": seconds}
+
+
+def capture_screenshots(serials, directory, concurrency=4, adb="adb"):
+    """Capture Screenshots of Many Devices.
+
+    Args:
+        serials (list): Serials of devices
+        directory (str): Folder to save the screenshots to. Made if it doesn't exist
+        concurrency (int): Most screenshots to capture at once
+        adb (str): adb executable, only used if the adb server can't be reached
+
+    Returns:
+        list: Result of capture_screenshot() for each device, in the order of serials, with "error"
+            set to the error message (or None)
+
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    os.makedirs(directory, exist_ok=True)
+
+    def capture(serial):
+        start = monotonic()
+        try:
+            result = capture_screenshot(serial, directory, adb)
+            result["error"] = None
+        except CommandExecutionError as e:
+            result = {"serial": serial, "path": None, "bytes": 0, "seconds": monotonic() - start, "error": str(e)}
+        return result
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as pool:
+        return list(pool.map(capture, serials))
+
+
+def screenshots_from_cli(serials=None, directory="screenshots", concurrency=4):
+    """Capture Screenshots Without the GUI.
+
+    Args:
+        serials (list): Serials of devices. If empty or None, the devices picked in the saved settings
+            (see selected_serials())
+        directory (str): Folder to save the screenshots to
+        concurrency (int): Most screenshots to capture at once
+
+    Returns:
+        int: 0 if every screenshot was captured, 1 otherwise
+
+    """
+    tools = find_tools()
+    if tools["adb"] is None:
+        print("ADB not installed! Run scrcpy-gui without --screenshot to install it.")
+        return 1
+    start_adb_server(tools["adb"])
+    if not serials:
+        try:
+            serials = selected_serials(values_from_db(), adb_client.devices())
+        except (OSError, CommandExecutionError, ValueError) as e:
+            print("Can't tell which devices to capture: {}".format(e))
+            return 1
+    if not serials:
+        print("No devices connected!")
+        return 1
+    start = monotonic()
+    results = capture_screenshots(serials, directory, concurrency, tools["adb"])
+    print("{:<24} {:>8} {:>10}  {}".format("Device", "Time", "Size", "File"))
+    for result in results:
+        print("{:<24} {:>8} {:>10}  {}".format(result["serial"], "{:.2f}s".format(result["seconds"]),
+                                             "{:.1f}KB".format(result["bytes"] / 1024), result["path"] or result["error"]))
+    print("Captured {} of {} in {:.2f}s".format(sum(1 for r in results if r["error"] is None), len(results), monotonic() - start))
+    return 0 if all(r["error"] is None for r in results) else 1
+
+
+def scan_from_cli(network=None, port=5555):
+    """Scan for Devices Without the GUI.
+
+    Args:
+        network (str): Network to scan, such as "192.168.1.0/24". Defaults to the local one
+        port (int): Port devices listen for adb on
+
+    Returns:
+        int: 0 if a device was found, 1 otherwise
+
+    """
+    start = monotonic()
+    try:
+        found = scan_network(network, port)
+    except (ValueError, OSError) as e:
+        print("Can't scan {}: {}".format(network or "the local network", e))
+        return 1
+    print("Scanned in {:.2f}s".format(monotonic() - start))
+    if not found:
+        print("No devices found!")
+        return 1
+    print("{:<22} {:<14} {}".format("Address", "State", "Model"))
+    for device in found:
+        print("{:<22} {:<14} {}".format("{}:{}".format(device["addr"], device["port"]), device["state"], device["model"]))
+    return 0
+
+
+scrcpy_version = "v1.14"
+scrcpy_source_url = "https://github.com/Genymobile/scrcpy/archive/{0}.tar.gz"
+scrcpy_server_url = "https://github.com/Genymobile/scrcpy/releases/download/{0}/scrcpy-server-{0}"
+# SHA-256 of release files, as published in scrcpy's README and BUILD.md for their tag. Fetches of
+# files listed here are checked against them.
+scrcpy_sha256 = {
+    "scrcpy-server-v1.14": "1d1b18a2b80e956771fd63b99b414d2d028713a8f12ddfa5a369709ad4295620",
+}
+scrcpy_build_packages = ["ffmpeg", "libsdl2-2.0-0", "gcc", "pkg-config", "meson", "ninja-build",
+                         "libavcodec-dev", "libavformat-dev", "libavutil-dev", "libsdl2-dev"]
+
+
+def sha256_file(path):
+    """Hash File.
+
+    Args:
+        path (str): File to hash
+
+    Returns:
+        str: SHA-256 of the file, as hex
+
+    """
+    import hashlib  # Only needed for installing, so kept out of startup
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1048576), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download_file(url, dest, sha256=None, progress=None, chunk_size=65536):
+    """Download File.
+
+    Streams the download to disk chunk by chunk. Partial downloads are kept as dest + ".part" and
+    resumed with an HTTP Range request next time.
+
+    Args:
+        url (str): URL to download
+        dest (str): File to save to
+        sha256 (str): Expected SHA-256 of the file, if known
+        progress (function): Called with bytes downloaded so far and the total size (None if unknown)
+        chunk_size (int): Bytes to read at a time
+
+    Raises:
+        CommandExecutionError: If the download fails or the checksum doesn't match
+
+    """
+    import urllib.request  # Only needed for installing, and slow to import, so kept out of startup
+    import urllib.error
+    import hashlib
+    part = dest + ".part"
+    digest = hashlib.sha256()
+    done = 0
+    if os.path.isfile(part):
+        with open(part, "rb") as f:
+            for chunk in iter(lambda: f.read(1048576), b""):
+                digest.update(chunk)
+                done += len(chunk)
+    request = urllib.request.Request(url)
+    if done:
+        request.add_header("Range", "bytes={}-".format(done))
+    try:
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            if e.code != 416:  # 416 means we asked for bytes past the end, so the part file is complete
+                raise
+            response = None
+        if response is None:
+            total = done
+        else:
+            with response:
+                length = response.headers.get("Content-Length")
+                if response.status == 206:
+                    print("Resuming download at {} bytes".format(done))
+                    total = done + int(length) if length is not None else None
+                    mode = "ab"
+                else:
+                    digest = hashlib.sha256()
+                    done = 0
+                    total = int(length) if length is not None else None
+                    mode = "wb"
+                with open(part, mode) as f:
+                    for chunk in iter(lambda: response.read(chunk_size), b""):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        done += len(chunk)
+                        if progress is not None:
+                            progress(done, total)
+    except (OSError, ValueError) as e:
+        raise CommandExecutionError("Failed to download {}: {}".format(url, e))
+    if total is not None and done != total:
+        raise CommandExecutionError("Download of {} ended early ({} of {} bytes)".format(url, done, total))
+    if sha256 is not None and digest.hexdigest() != sha256:
+        os.remove(part)
+        raise CommandExecutionError("Checksum mismatch for {}! Expected {}, got {}".format(url, sha256, digest.hexdigest()))
+    os.replace(part, dest)
+
+
+def extract_zip(path, dest, progress=None):
+    """Extract Zip File.
+
+    Members are read straight from the zip on disk (checking each one's CRC as they go) into a staging
+    folder, which replaces dest once everything has been extracted.
+
+    Args:
+        path (str): Zip file
+        dest (str): Folder to extract to. Replaced if it exists.
+        progress (function): Called with the amount of members extracted so far and the total
+
+    Raises:
+        CommandExecutionError: If the zip is damaged
+
+    """
+    import zipfile  # Only needed for installing, so kept out of startup
+    staging = dest + ".new"
+    try:
+        rmtree(staging)
+    except FileNotFoundError:
+        pass
+    try:
+        with zipfile.ZipFile(path, "r") as z_file:
+            members = z_file.infolist()
+            for i, member in enumerate(members):
+                z_file.extract(member, staging)
+                if progress is not None:
+                    progress(i + 1, len(members))
+    except (zipfile.BadZipFile, OSError) as e:
+        raise CommandExecutionError("Failed to extract {}: {}".format(path, e))
+    print("Deleting old install area (if it exists!)")
+    try:
+        rmtree(dest)
+    except FileNotFoundError:
+        pass
+    os.replace(staging, dest)
+
+
+def fetch_artifact(name, url, cache, mirror=None, sha256=None):
+    """Fetch Artifact Into Cache.
+
+    Artifacts are stored under their SHA-256, with an index from name to hash. A cached artifact
+    whose hash still matches is used as is, without downloading anything.
+
+    Args:
+        name (str): Artifact file name, such as "scrcpy-server-v1.14"
+        url (str): URL to download from if it isn't cached
+        cache (str): Cache directory
+        mirror (str): Local directory to copy the artifact from instead of downloading it
+        sha256 (str): Expected SHA-256. If None, the hash from the first fetch is trusted from then on
+
+    Returns:
+        str: Path of the cached artifact
+
+    Raises:
+        CommandExecutionError: If fetching fails or the hash doesn't match
+
+    """
+    artifacts = os.path.join(cache, "artifacts")
+    os.makedirs(artifacts, exist_ok=True)
+    index_file = os.path.join(artifacts, "index.json")
+    try:
+        with open(index_file) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    known = sha256 or index.get(name)
+    if known is not None and os.path.isfile(os.path.join(artifacts, known)) and sha256_file(os.path.join(artifacts, known)) == known:
+        print("Using cached {}".format(name))
+        return os.path.join(artifacts, known)
+    tmp_path = os.path.join(artifacts, name + ".download")
+    if mirror is not None:
+        print("Copying {} from {}".format(name, mirror))
+        try:
+            shutil.copyfile(os.path.join(mirror, name), tmp_path)
+        except OSError as e:
+            raise CommandExecutionError("Failed to fetch {}: {}".format(name, e))
+    else:
+        print("Downloading {}".format(url))
+        download_file(url, tmp_path)
+    digest = sha256_file(tmp_path)
+    if known is not None and digest != known:
+        os.remove(tmp_path)
+        raise CommandExecutionError("Checksum mismatch for {}! Expected {}, got {}".format(name, known, digest))
+    os.replace(tmp_path, os.path.join(artifacts, digest))
+    index[name] = digest
+    with open(index_file, "w") as f:
+        json.dump(index, f)
+    return os.path.join(artifacts, digest)
+
+
+def fetch_source(version, cache, mirror=None):
+    """Fetch scrcpy Source Into Cache.
+
+    Args:
+        version (str): scrcpy version tag, such as "v1.14"
+        cache (str): Cache directory
+        mirror (str): Local directory holding a "scrcpy-<version>" folder or "scrcpy-<version>.tar.gz"
+            to use instead of downloading the source tarball from GitHub
+
+    Returns:
+        str: Path of the source tree. Left in place between runs, so its build directory is reused.
+
+    Raises:
+        CommandExecutionError: If fetching fails
+
+    """
+    name = "scrcpy-" + version
+    src = os.path.join(cache, "src", name)
+    stamp = os.path.join(src, ".scrcpy-gui-fetched")
+    if os.path.isfile(stamp):
+        print("Using cached {} source".format(version))
+        return src
+    tmp_src = src + ".part"
+    try:
+        rmtree(tmp_src)
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(src), exist_ok=True)
+    if mirror is not None and os.path.isdir(os.path.join(mirror, name)):
+        print("Copying {} source from {}".format(version, mirror))
+        shutil.copytree(os.path.join(mirror, name), tmp_src)
+    else:
+        # A tarball rather than a git clone, so fetching doesn't need git installed first
+        if mirror is not None:
+            tarball = os.path.join(mirror, name + ".tar.gz")
+            print("Extracting {} source from {}".format(version, mirror))
+        else:
+            tarball = os.path.join(os.path.dirname(src), name + ".tar.gz")
+            print("Downloading {} source".format(version))
+            download_file(scrcpy_source_url.format(version), tarball)
+        import tarfile  # Only needed for installing, so kept out of startup
+        try:
+            with tarfile.open(tarball) as tar:
+                top = tar.getnames()[0].split("/")[0]
+                tar.extractall(os.path.dirname(src))
+        except (OSError, tarfile.TarError, IndexError) as e:
+            raise CommandExecutionError("Failed to get source from {}: {}".format(tarball, e))
+        os.replace(os.path.join(os.path.dirname(src), top), tmp_src)
+        if mirror is None:
+            os.remove(tarball)
+    try:
+        rmtree(src)
+    except FileNotFoundError:
+        pass
+    os.replace(tmp_src, src)
+    open(stamp, "w").close()
+    return src
+
+
+def build_scrcpy(version=scrcpy_version, cache=None, mirror=None, progress=None):
+    """Build and Install scrcpy From Source.
+
+    Sources, the server binary and the meson build directory are all kept in the cache, so running
+    this again with nothing changed only has ninja check that everything is up to date, and skips
+    installing a binary that's already installed.
+
+    Args:
+        version (str): scrcpy version tag
+        cache (str): Cache directory. Defaults to a "build" folder in cache_dir()
+        mirror (str): Local directory to fetch sources and the server from instead of the internet
+        progress (function): Called with a percentage (0-100) as each step finishes
+
+    Raises:
+        CommandExecutionError: If a step fails
+
+    """
+    cache = cache or os.path.join(cache_dir(), "build")
+    progress = progress or (lambda pct: None)
+    src = fetch_source(version, cache, mirror)
+    progress(30)
+    server = fetch_artifact("scrcpy-server-" + version, scrcpy_server_url.format(version), cache, mirror,
+                            scrcpy_sha256.get("scrcpy-server-" + version))
+    progress(40)
+    build = os.path.join(src, "x")
+    if not os.path.isfile(os.path.join(build, "build.ninja")):
+        print("Configuring build...")
+        run(["meson", build, src, "--buildtype", "release", "--strip", "-Db_lto=true", "-Dprebuilt_server=" + server])
+    progress(50)
+    print("Compiling...")
+    run(["ninja", "-C", build])
+    progress(90)
+    binary = os.path.join(build, "app", "scrcpy")
+    installed_stamp = os.path.join(build, ".scrcpy-gui-installed")
+    try:
+        with open(installed_stamp) as f:
+            up_to_date = which("scrcpy") is not None and f.read() == sha256_file(binary)
+    except OSError:
+        up_to_date = False
+    if up_to_date:
+        print("scrcpy {} is already installed!".format(version))
+    else:
+        run(["sudo", "ninja", "-C", build, "install"])
+        with open(installed_stamp, "w") as f:
+            f.write(sha256_file(binary))
+    progress(100)
+
+
+def parse_args(argv=None):
+    """Parse Command-Line Arguments.
+
+    Args:
+        argv (list): Arguments to parse. Defaults to sys.argv[1:]
+
+    Returns:
+        argparse.Namespace: Parsed arguments
+
+    """
+    parser = argparse.ArgumentParser(description="A GUI for scrcpy.")
+    parser.add_argument("--from-settings", action="store_true",
+                        help="launch scrcpy with the saved settings without showing the GUI")
+    parser.add_argument("--fleet", nargs="*", metavar="SERIAL",
+                        help="mirror many devices at once with the saved settings (all connected devices if no serials are given)")
+    parser.add_argument("--fleet-concurrency", type=int, default=4, metavar="N",
+                        help="most devices to start up at once in fleet mode; every device is mirrored once started (default: 4)")
+    parser.add_argument("--fleet-stagger", type=float, default=0.5, metavar="SECONDS",
+                        help="least time between two scrcpy starts in fleet mode (default: 0.5)")
+    parser.add_argument("--screenshot", nargs="*", metavar="SERIAL",
+                        help="capture a screenshot of every listed device (the devices picked in the saved settings, or all connected ones, if none are listed)")
+    parser.add_argument("--screenshot-dir", default="screenshots", metavar="DIR",
+                        help="folder to save screenshots to (default: screenshots)")
+    parser.add_argument("--screenshot-concurrency", type=int, default=4, metavar="N",
+                        help="most screenshots to capture at once (default: 4)")
+    parser.add_argument("--scan", nargs="?", const="", metavar="NETWORK",
+                        help="list devices listening for adb over Wi-Fi on NETWORK (such as 192.168.1.0/24, default: the local /24)")
+    parser.add_argument("--scan-port", type=int, default=5555, metavar="PORT",
+                        help="port to look for devices on with --scan (default: 5555)")
+    parser.add_argument("--max-restarts", type=int, default=5, metavar="N",
+                        help="most times to restart scrcpy after it crashes within a minute (default: 5)")
+    parser.add_argument("--nice", type=int, metavar="N",
+                        help="nice level to run scrcpy at")
+    parser.add_argument("--cpus", type=parse_cpus, metavar="LIST",
+                        help="CPUs scrcpy may run on, such as 0-3,6 (Linux only)")
+    parser.add_argument("--cpu-max", type=float, metavar="PERCENT",
+                        help="most CPU time each scrcpy may use, in percent of one CPU (needs cgroup v2)")
+    parser.add_argument("--memory-max", type=int, metavar="MB",
+                        help="most memory each scrcpy may use, in megabytes (needs cgroup v2)")
+    parser.add_argument("--retune", action="store_true",
+                        help="probe the device again instead of using cached capabilities and auto-tuned settings")
+    parser.add_argument("--use-profile", metavar="NAME",
+                        help="settings profile to use (default: the last one used)")
+    parser.add_argument("--mirror", metavar="DIR", default=os.environ.get("SCRCPY_GUI_MIRROR"),
+                        help="local directory to fetch scrcpy's source and server from when installing on Linux")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve frame rates and resource use of running sessions in Prometheus format on localhost:PORT/metrics")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="append timestamps of every launch phase to FILE as JSON lines")
+    parser.add_argument("--profile", action="store_true",
+                        help="print how long each launch phase took when scrcpy-gui exits")
+    return parser.parse_args(argv)
+
+
+def resource_policy(args):
+    """Make Resource Policy From Arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments
+
+    Returns:
+        ResourcePolicy: Policy to run scrcpy with, or None if no limits were asked for
+
+    """
+    if args.nice is None and args.cpus is None and args.cpu_max is None and args.memory_max is None:
+        return None
+    return ResourcePolicy(args.nice, args.cpus, args.cpu_max,
+                          args.memory_max * 1048576 if args.memory_max is not None else None)
+
+
+is_crostini = os.path.isfile("/usr/share/themes/CrosAdapta/index.theme")
+
+def import_gui():
+    """Import GUI Modules.
+
+    Imports tkinter and PySimpleGUI (offering to install them if they're missing). Only done when
+    the GUI is actually shown, so headless launches and importing this file don't need a display.
+
+    """
+    global tkinter, sg
+    try:
+        import tkinter
+    except ImportError:
+        tkinter_install = input("tkinter not installed! Would you like to try to install it [Y/n]?")
+        if tkinter_install.lower() == "y" or tkinter_install.lower() == "yes" or tkinter_install.lower() == "":
+            if which("apt") is not None:
+                apt_install("python3-tk")
+            elif which("apt-get") is not None:
+                run(["sudo", "apt-get", "install", "python3-tk", "-y"])
+            elif which("pacman") is not None:
+                run(["sudo", "pacman", "-S", "tk", "--noconfirm"])
+            elif which("dnf") is not None:
+                run(["sudo", "dnf", "install", "python3-tkinter", "-y"])
+            else:
+                print("Your system does not support automatic installation of tkinter! Please install it!")
+                sys.exit(1)
+            import tkinter
+        else:
+            sys.exit(1)
+
+    try:
+        import PySimpleGUI as sg
+    except ImportError:
+        pysgui_install = input("PySimpleGUI not installed! Would you like to install it [Y/n]?")
+        if pysgui_install.lower() == "y" or pysgui_install.lower() == "yes" or pysgui_install.lower() == "":
+            pip_install("PySimpleGUI")
+            import PySimpleGUI as sg
+        else:
+            sys.exit(1)
+
+
+def run_tasks(title, message, stages):
+    """Run Tasks in Progress Window.
+
+    Tasks run on a TaskRunner while the window shows their combined progress and the output of
+    the commands they run, and lets the user cancel. Failures are shown in a popup.
+
+    Args:
+        title (str): Window title
+        message (str): Message to show until a task reports what it's doing
+        stages (list): Lists of (name, function) pairs. The tasks in a stage run at the same time, and
+            each stage starts once the one before it is done. Functions are called with their Task.
+
+    Returns:
+        dict: Result of each task by name, or None if a task failed or the user cancelled
+
+    """
+    layout = [
+        [sg.Text(message, key="message", size=(60, 1))],
+        [sg.ProgressBar(100, orientation='h', size=(40, 20), key='bar')],
+        [sg.Multiline(size=(80, 12), key="log", autoscroll=True, disabled=True)],
+        [sg.Button("Cancel")]
+    ]
+    window = sg.Window(title, layout).Finalize()
+    runner = TaskRunner(window.write_event_value)
+    total = sum(len(stage) for stage in stages) or 1
+    progress = {}
+    results = {}
+    try:
+        for stage in stages:
+            pending = set()
+            for name, func in stage:
+                runner.submit(name, func)
+                pending.add(name)
+            while pending:
+                event, values = window.Read()
+                if event in (None, "Cancel"):
+                    print("Cancelling...")
+                    runner.cancel()
+                    return None
+                if event == "task_log":
+                    name, line = values[event]
+                    print(line)
+                    window.Element("log").Update(line + "\n", append=True)
+                    continue
+                if event == "task_progress":
+                    name, pct, status = values[event]
+                    progress[name] = pct
+                    if status is not None:
+                        window.Element("message").Update(status)
+                elif event == "task_done":
+                    name, result, error = values[event]
+                    pending.discard(name)
+                    if error is not None:
+                        runner.cancel()
+                        if error != "cancelled":
+                            print(error)
+                            sg.Popup(str(error))
+                        return None
+                    results[name] = result
+                    progress[name] = 100
+                window.Element("bar").UpdateBar(sum(progress.values()) // total)
+        return results
+    finally:
+        runner.shutdown()
+        window.Close()
+
+
+def scrcpy_install_linux(mirror=None):
+    """Setup scrcpy and adb on Linux.
+
+    Args:
+        mirror (str): Local directory to fetch scrcpy's source and server from instead of the internet
+
+    """
+    if os.getuid() != 0:
+        sg.Popup("Root is required to complete this first time setup! Please run this script as root!")
+        sys.exit(1)
+    else:
+        print("Installing scrcpy and ADB...")
+        try:
+            import distro
+        except ImportError:
+            if sg.PopupYesNo("The 'distro' package isn't installed! Would you like scrcpy-gui to install it?") == "Yes":
+                pip_install("distro")
+                import distro
+            else:
+                sys.exit(1)
+        dist = distro.linux_distribution(full_distribution_name=False)
+        if which("apt") is not None:
+            # Package installs and fetching scrcpy's source and server don't depend on each other,
+            # so they run at the same time, and only the build waits for both.
+            cache = os.path.join(cache_dir(), "build")
+
+            def fetch(task):
+                task.progress(0, "Fetching scrcpy...")
+                fetch_source(scrcpy_version, cache, mirror)
+                task.progress(70)
+                server = "scrcpy-server-" + scrcpy_version
+                fetch_artifact(server, scrcpy_server_url.format(scrcpy_version), cache, mirror, scrcpy_sha256.get(server))
+
+            def packages(task):
+                task.progress(0, "Installing ADB and scrcpy's build requirements...")
+                apt_install(["adb"] + scrcpy_build_packages, update=True)
+
+            def build(task):
+                task.progress(0, "Compiling and installing scrcpy...")
+                build_scrcpy(scrcpy_version, cache, mirror, progress=task.progress)
+            stages = [[("packages", packages), ("fetch", fetch)], [("build", build)]]
+        elif which("pacman") is not None:
+            stages = [[("pacman", lambda task: run(["sudo", "pacman", "-S", "android-tools", "scrcpy", "--noconfirm"]))]]
+        elif which("apt-get") is not None:
+            stages = [[("apt-get", lambda task: run(["sudo", "apt-get", "update"]))],
+                      [("adb", lambda task: run(["sudo", "apt-get", "install", "adb", "-y"]))]]
+        elif which("yum") is not None:
+            stages = [[("adb", lambda task: run(["yum", "-y", "install", "android-tools"]))]]
+        else:
+            stages = []
+        if run_tasks("Installing...", "Preparing scrcpy and adb...", stages) is None:
+            print("Exiting setup...")
+            sys.exit(1)
+        if which("apt") is None and which("pacman") is None:
+            sg.Popup("Your OS doesn't support automatic installation of scrcpy.")
+            sys.exit(1)
+        sg.Popup("Please run this script again as your user (not root!).")
+        sys.exit(0)
+
+
+def scrcpy_install_win():
+    """Setup scrcpy and adb on Windows."""
+    print("Installing scrcpy and ADB...")
+    setup_dir = full("%temp%/scrcpy-gui-setup")
+    os.makedirs(setup_dir, exist_ok=True)  # Kept between runs, so an interrupted download can be resumed
+    is_64bits = sys.maxsize > 2**32
+    if is_64bits:
+        print("Choosing 64-bit version")
+        zip_name = "scrcpy-win64-v1.10.zip"
+    else:
+        print("Choosing 32-bit version.")
+        zip_name = "scrcpy-win32-v1.10.zip"
+    zip_path = os.path.join(setup_dir, zip_name)
+    scrcpy_install = full("%userprofile%/scrcpy")
+
+    def download(task):
+        task.progress(0, "Downloading scrcpy...")
+        try:
+            if zip_name not in scrcpy_sha256:
+                print("No published SHA-256 known for {}, so it can't be checked!".format(zip_name))
+            download_file("https://github.com/Genymobile/scrcpy/releases/download/v1.10/" + zip_name, zip_path,
+                          scrcpy_sha256.get(zip_name), progress=lambda done, total: task.progress(done * 100 // total) if total else task.check())
+        except CommandExecutionError as e:
+            raise CommandExecutionError("{}\nRun scrcpy-gui again to resume the download.".format(e))
+
+    def extract(task):
+        task.progress(0, "Extracting scrcpy to {}...".format(scrcpy_install))
+        try:
+            extract_zip(zip_path, scrcpy_install, progress=lambda done, total: task.progress(done * 100 // total))
+        except CommandExecutionError as e:
+            os.remove(zip_path)
+            raise CommandExecutionError("{}\nThe downloaded scrcpy zip is damaged! Please run scrcpy-gui again to download it again.".format(e))
+        os.remove(zip_path)
+    if run_tasks("Installing...", "Preparing scrcpy and adb...", [[("download", download)], [("extract", extract)]]) is None:
+        sys.exit(1)
+
+
+def wait_for_devices(tracker, ready, message):
+    """Wait for Devices.
+
+    Shows a waiting window until the device list is how we want it, moving on by itself as soon as it is.
+
+    Args:
+        tracker (DeviceTracker): Running device tracker
+        ready (function): Called with the device list, returns whether we're done waiting
+        message (str): Message to show while waiting
+
+    Returns:
+        bool: False if the user cancelled
+
+    """
+    wait_layout = [
+        [sg.Text(message)],
+        [sg.Text("If there is an option to allow USB debugging, please allow it now!", key="status", size=(60, 1))],
+        [sg.Button("Cancel")]
+    ]
+    wait_window = sg.Window("Waiting...", wait_layout).Finalize()
+    tracker.callback = lambda devices: wait_window.write_event_value("devices", devices)
+    devices = tracker.devices  # Checked after setting the callback so a change in between isn't missed
+    try:
+        while not ready(devices):
+            event, wait_values = wait_window.Read()
+            if event in (None, "Cancel"):
+                return False
+            devices = wait_values["devices"]
+            if any(d["state"] == "unauthorized" for d in devices):
+                wait_window.Element("status").Update("Please allow USB debugging on your phone!")
+            else:
+                wait_window.Element("status").Update("Connected: " + (", ".join(d["serial"] for d in devices) or "nothing yet"))
+        return True
+    finally:
+        tracker.callback = None
+        wait_window.Close()
+
+
+def ensure_installed(mirror=None):
+    """Make Sure adb and scrcpy Are Installed.
+
+    Offers to install them if they aren't.
+
+    Args:
+        mirror (str): Local directory to fetch scrcpy's source and server from when installing on Linux
+
+    Returns:
+        dict: Paths for "adb" and "scrcpy" (see find_tools())
+
+    """
+    tools = find_tools()
+    if tools["adb"] is None or tools["scrcpy"] is None:
+        print("ADB/scrcpy not installed!")
+        import platform  # Only needed for installing, so kept out of startup
+        osys = platform.system()
+        auto_install_prompt = "Would you like to automatically install ADB and scrcpy? By doing so, you agree to any and all license agreements that come with those pieces of software!"
+        if osys == "Windows":
+            response = sg.PopupYesNo(auto_install_prompt)
+            if response == "Yes":
+                scrcpy_install_win()
+                tools = find_tools()
+            else:
+                print("Not installing! Exiting...")
+                sys.exit(1)
+        elif osys == "Linux":
+            try:
+                response = sg.PopupYesNo(auto_install_prompt)
+            except tkinter.TclError:
+                if is_crostini:
+                    print("#"*20)
+                    print("Please run the following command: xhost +si:localuser:root")
+                    print("#"*20)
+                sys.exit(1)
+            if response == "Yes":
+                scrcpy_install_linux(mirror)
+            else:
+                print("Not installing! Exiting...")
+                sys.exit(1)
+        else:
+            print("Your OS does not support automatic installation! Exiting...")
+            sg.Popup("ADB not installed! Please install ADB (comes with scrcpy on Windows), and add it to your PATH!")
+            sys.exit(1)
+    return tools
+
+
+def fill_form(window):
+    """Fill Form From Database.
+
+    Args:
+        window (sg.Window): Main window
+
+    """
+    for form_key, db_key in db_keys.items():
+        val = get_val(db_key, db_defaults[db_key])
+        if form_key == "usb_mode":
+            window.Element("usb_mode" if val else "wifi_mode").Update(value=True)
+        else:
+            window.Element(form_key).Update(value=val)
+
+
+def pick_scanned_device(window, values):
+    """Scan for Devices and Pick One.
+
+    Scans the local network for devices listening for adb, and fills in the Wi-Fi options with the
+    one the user picks.
+
+    Args:
+        window (sg.Window): Options window
+        values (dict): Dictionary from user selected options
+
+    Returns:
+        bool: Whether a device was picked
+
+    """
+    try:
+        port = int(get_port(values))
+    except ValueError as e:
+        sg.Popup(str(e))
+        return False
+    found = run_tasks("Scanning...", "Looking for devices on your network...", [[(
+        "scan", lambda task: scan_network(port=port, progress=lambda done, total: task.progress(done * 100 // total)))]])
+    if found is None:
+        return False
+    devices = found["scan"]
+    if not devices:
+        sg.Popup("No devices found! Make sure your phone is on the same network and listening for adb over Wi-Fi.")
+        return False
+    labels = ["{}:{}  {} ({})".format(d["addr"], d["port"], d["model"] or "Unknown model", d["state"]) for d in devices]
+    pick_layout = [
+        [sg.Text("Found {} device(s):".format(len(devices)))],
+        [sg.Listbox(labels, key="device", size=(50, min(len(labels), 10)), bind_return_key=True)],
+        [sg.Button("Use"), sg.Button("Cancel")]
+    ]
+    pick_window = sg.Window("Devices", pick_layout).Finalize()
+    try:
+        while True:
+            event, pick_values = pick_window.Read()
+            if event in (None, "Cancel"):
+                return False
+            if pick_values["device"]:
+                device = devices[labels.index(pick_values["device"][0])]
+                break
+    finally:
+        pick_window.Close()
+    window.Element("wifi_mode").Update(True)
+    window.Element("addr").Update(device["addr"])
+    if device["port"] != 5555:
+        window.Element("use_port").Update(True)
+        window.Element("port").Update(str(device["port"]))
+    return True
+
+
+def take_screenshots(values, devices, adb):
+    """Capture Screenshots of Selected Devices.
+
+    Captures the devices picked in the form (see selected_serials()) at the same time, at most four
+    at once, and shows how long each took.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        devices (list): Connected devices, from the DeviceTracker
+        adb (str): adb executable
+
+    """
+    try:
+        serials = selected_serials(values, devices)
+    except ValueError as e:
+        sg.Popup(str(e))
+        return
+    if not serials:
+        sg.Popup("No devices connected!")
+        return
+    directory = sg.PopupGetFolder("Save screenshots of {} device(s) to:".format(len(serials)),
+                                  default_path=values["record_dir"] or full("./screenshots"))
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        sg.Popup("Can't save screenshots to {}: {}".format(directory, e))
+        return
+
+    def capture(task, serial):
+        task.progress(0, "Capturing {}...".format(serial))
+        try:
+            return capture_screenshot(serial, directory, adb, task.check)
+        except CommandExecutionError as e:  # Shown with the others, instead of stopping them
+            return {"serial": serial, "seconds": None, "error": str(e)}
+    results = run_tasks("Capturing...", "Capturing screenshots...",
+                        [[(serial, lambda task, serial=serial: capture(task, serial)) for serial in serials]])
+    if results is not None:
+        sg.Popup("\n".join(result["error"] if result.get("error") else "{}: {:.2f}s".format(serial, result["seconds"])
+                           for serial, result in results.items()), title="Screenshots saved to " + directory)
+
+
+def describe_session(snapshot):
+    """Describe Session Metrics.
+
+    Args:
+        snapshot (dict): Metrics from SessionMetrics.snapshot()
+
+    Returns:
+        str: One line summary to show the user
+
+    """
+    if snapshot["fps"] is None:
+        parts = ["Press Ctrl+i in scrcpy to see its frame rate"]
+    else:
+        parts = ["{} fps ({:.1f} average, {} skipped)".format(snapshot["fps"], snapshot["fps_avg"], snapshot["skipped"])]
+    if snapshot["cpu"] is not None:
+        parts.append("CPU {:.0f}%, {:.0f}MB".format(snapshot["cpu"], snapshot["rss_mb"]))
+    if snapshot["latency_ms"] is not None:
+        parts.append("{:.0f}ms latency, {} reconnects".format(snapshot["latency_ms"], snapshot["reconnects"]))
+    if snapshot["restarts"]:
+        parts.append("{} restarts".format(snapshot["restarts"]))
+    return " | ".join(parts)
+
+
+def show_session(values, command, max_restarts=5, device=None, policy=None):
+    """Run Session With Stats Window.
+
+    Runs run_session() on another thread while a small window shows its frame rate and resource use,
+    updated every second. Closing the window leaves scrcpy running, and "Stop scrcpy" stops it.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        command (list): scrcpy command from build_command()
+        max_restarts (int): Most times to restart scrcpy after it crashes in a minute
+        device (str): Serial of the device being mirrored, if known
+        policy (ResourcePolicy): Resource policy to run scrcpy with, if any
+
+    Returns:
+        int: Exit code scrcpy gave us
+
+    """
+    result = []
+    session_thread = threading.Thread(target=lambda: result.append(run_session(values, command, max_restarts, device, policy)),
+                                      daemon=True)
+    session_thread.start()
+    session_layout = [
+        [sg.Text("Starting scrcpy...", key="stats", size=(90, 1))],
+        [sg.Button("Stop scrcpy")]
+    ]
+    session_window = sg.Window("scrcpy-gui", session_layout).Finalize()
+    try:
+        while session_thread.is_alive():
+            event, _ = session_window.Read(timeout=1000)
+            sessions = metrics.sessions()
+            if event is None:
+                break
+            if event == "Stop scrcpy":
+                for session in sessions:
+                    session.supervisor.stop()
+                session_window.Element("stats").Update("Stopping scrcpy...")
+                continue
+            if sessions:
+                session_window.Element("stats").Update(describe_session(sessions[0].snapshot()))
+    finally:
+        session_window.Close()
+    session_thread.join()
+    return result[0] if result else 1
+
+
+def form_serial(values, devices):
+    """Get Serial of Device Picked in Form.
+
+    Args:
+        values (dict): Dictionary from user selected options
+        devices (list): Connected devices, from the DeviceTracker
+
+    Returns:
+        str: Serial of the device ("ip:port" in Wi-Fi mode), or None if none is picked (such as with
+            several USB devices connected and no serial number set)
+
+    """
+    if values["wifi_mode"]:
+        try:
+            return target_serial(values) if values["addr"] != "" else None
+        except ValueError:
+            return None
+    if values["use_sn"] and values["sn"] != "":
+        return values["sn"]
+    usb = [d["serial"] for d in devices if d["state"] == "device" and ":" not in d["serial"]]
+    return usb[0] if len(usb) == 1 else None
+
+
+def prefill_form(window, values, serial):
+    """Prefill Form From Device Capabilities.
+
+    Only uses capabilities that are already cached, so it never waits on the device.
+
+    Args:
+        window (sg.Window): Options window
+        values (dict): Dictionary from user selected options
+        serial (str): Serial from form_serial(), or None
+
+    """
+    capabilities = cached_capabilities(serial) if serial is not None else None
+    if capabilities is not None:
+        for key, value in prefill_options(values, capabilities).items():
+            window.Element(key).Update(value)
+
+
+def run_gui(args, tools, policy=None):
+    """Run GUI.
+
+    Shows the options window, then connects to the device and runs scrcpy.
+
+    Args:
+        args (argparse.Namespace): Parsed command-line arguments
+        tools (dict): Paths for "adb" and "scrcpy" (see find_tools())
+        policy (ResourcePolicy): Resource policy to run scrcpy with, if any
+
+    Returns:
+        int: Exit code to leave scrcpy-gui with
+
+    """
+    if which("adb") is None or which("scrcpy") is None:
+        print("Using scrcpy directory installed by scrcpy-gui!")  # find_tools() already gave full paths to it
+    start_adb_server(tools["adb"])
+    if args.use_profile is None:
+        switch_profile(store.profile_for_device(connected_serial()))
+
+    print("Building GUI...")
+    gui_build_start = monotonic()
+    widgets = WidgetState(widget_rules, values_from_db())
+    disabled = widgets.state
+    layout = [
+        [sg.Text("Profile: "), sg.Combo(store.names() or [profile], key="profile", default_value=profile, enable_events=True, size=(20,None))],
+        [sg.Text("Select options:")],
+        [sg.Text("Mode: "), sg.Radio("USB", "mode", default=get_val("is_usb", True), enable_events=True, key="usb_mode"), sg.Radio("Wi-Fi", "mode", enable_events=True, key="wifi_mode", default=not(get_val("is_usb", True)))],
+        [sg.Text("IP Address: "), sg.InputText(key='addr', default_text=get_val("addr", ""), disabled=disabled["addr"], size=(20,None)), sg.Button("Scan")],
+        [sg.Checkbox("Custom port: ", key="use_port", default=get_val("use_port", False), enable_events=True, disabled=disabled["use_port"]), sg.InputText(key='port',size=(8,None),disabled=disabled["port"], default_text=get_val("port", ""))],
+        [sg.Checkbox("Custom resolution: ", key="use_resolution", enable_events=True, default=get_val("use_resolution", False)), sg.InputText(key='resolution',size=(8,None), disabled=disabled["resolution"], default_text=get_val("resolution", ""))],
+        [sg.Checkbox("Custom bitrate: ", key="use_bitrate", enable_events=True, default=get_val("use_bitrate", False)), sg.InputText(key='bitrate',size=(4,None),disabled=disabled["bitrate"], default_text=get_val("bitrate", ""))],
+        [sg.Checkbox("Device serial number: ", key="use_sn", enable_events=True, default=get_val("use_sn", False), disabled=disabled["use_sn"]), sg.Combo([get_val("sn", "")], key='sn', size=(30,None), enable_events=True, disabled=disabled["sn"], default_value=get_val("sn", ""))],
+        [sg.Checkbox("Set maximum framerate: ", key="use_framerate", enable_events=True, default=get_val("use_framerate", False)), sg.InputText(key='framerate',size=(4,None), disabled=disabled["framerate"], default_text=get_val("framerate", ""))],
+        [sg.Checkbox("Set Orientation: ", key="set_orien", enable_events=True, default=get_val("set_orien", False)), sg.Combo(list(rotation_options.keys()), key="orien", disabled=disabled["orien"], default_value=get_val("orien", ""))],
+        [sg.Checkbox("Fullscreen mode", key="use_fullscreen", default=get_val("full", False)), sg.Checkbox("Show physical screen taps", key="use_touches", default=get_val("taps", False))],
+        [sg.Checkbox("Turn screen off on start", key="sleep_screen", enable_events=True, default=get_val("sleep", False), disabled=disabled["sleep_screen"]), sg.Checkbox("Keep scrcpy window on top", key="on_top", default=get_val("top", False))],
+        [sg.Checkbox("Disable device control", key="no_device_control", enable_events=True, default=get_val("no_control", False), disabled=disabled["no_device_control"]), sg.Checkbox("Keep device awake", key="keep_awake", enable_events=True, default=get_val("keep_awake", False))],
+        [sg.Checkbox("Auto-tune resolution, bitrate and framerate (unless set above)", key="auto_tune", enable_events=True, default=get_val("auto_tune", False))],
+        [sg.Checkbox("Record to: ", key="record", enable_events=True, default=get_val("record", False)), sg.InputText(key="record_dir", size=(30,None), disabled=disabled["record_dir"], default_text=get_val("record_dir", "")), sg.FolderBrowse(key="record_browse", disabled=disabled["record_browse"])],
+        [sg.Text("New segment every"), sg.InputText(key="segment_seconds", size=(5,None), disabled=disabled["segment_seconds"], default_text=get_val("segment_seconds", "300")), sg.Text("seconds or"), sg.InputText(key="segment_mb", size=(5,None), disabled=disabled["segment_mb"], default_text=get_val("segment_mb", "")), sg.Text("MB, keep at most"), sg.InputText(key="record_max_mb", size=(6,None), disabled=disabled["record_max_mb"], default_text=get_val("record_max_mb", "")), sg.Text("MB"), sg.Checkbox("Compress", key="record_compress", disabled=disabled["record_compress"], default=get_val("record_compress", False))],
+        [sg.Text("If there is an option to allow USB debugging, please allow it now!")],
+        [sg.Button("Start scrcpy"), sg.Button("Exit"), sg.Button("Save settings"), sg.Button("Screenshots")]
+        ]
+
+    print("Launching GUI...")
+    try:
+        window = sg.Window('scrcpy GUI', layout=layout).Finalize()
+    except tkinter.TclError:
+        if is_crostini:
+            print("#"*20)
+            print("Please run the following command: xhost +si:localuser:root")
+            print("#"*20)
+        return 1
+    tracer.record("gui-build", gui_build_start)
+
+    tracker = DeviceTracker(callback=lambda devices: window.write_event_value("devices", devices))
+    tracker.start()
+    warmer = DeviceWarmer(on_ready=lambda key, state: window.write_event_value("warm", key))
+
+    cancel = False #Used later to check if we should exit after breaking out of the loop
+    while True:
+        event, values = window.Read()
+        if event in (None, 'Exit'): #None if we're closing, Exit if exit button is pressed
+            cancel = True
+            break
+        elif event == "Start scrcpy":
+            tracer.mark("start-pressed")
+            break
+        elif event == "Save settings":
+            save_db(values)
+            window.Element("profile").Update(values=store.names(), value=profile)
+        elif event == "profile" and values["profile"] in store.names():
+            switch_profile(values["profile"])
+            fill_form(window)
+            _, values = window.Read(timeout=0)  # Only for the new values, event still says what happened
+        elif event == "Screenshots":
+            take_screenshots(values, tracker.devices, tools["adb"])
+        elif event == "Scan":
+            if pick_scanned_device(window, values):
+                _, values = window.Read(timeout=0)
+        elif event == "devices":
+            window.Element("sn").Update(values=[d["serial"] for d in values["devices"]], value=values["sn"])
+        if event in ("devices", "sn", "profile", "usb_mode", "wifi_mode", "auto_tune", "Scan", "warm"):
+            serial = form_serial(values, tracker.devices)
+            prefill_form(window, values, serial)
+            warmer.warm(DeviceWarmer.make_key(serial, values["wifi_mode"], values["auto_tune"]))
+        widgets.apply(window, values)
+
+    save_db(values)
+
+    if cancel: #Window closed or exit button pressed
+        warmer.finish(None)
+        print("Exiting...")
+        return 0
+    warm = warmer.finish(DeviceWarmer.make_key(form_serial(values, tracker.devices), values["wifi_mode"], values["auto_tune"]))
+
+    print("Closing window...") #Close window while starting scrcpy
+    tracker.callback = None
+    window.Close()
+
+    if values["wifi_mode"] and warm is not None and warm["connected"]:
+        print("Already connected over Wi-Fi!")
+    else:
+        if values["wifi_mode"] or not(values["use_sn"]) or values["sn"] == "":
+            waiting_for = "your phone"
+            def device_ready(devices):
+                return any(d["state"] == "device" and (values["usb_mode"] or ":" not in d["serial"]) for d in devices)
+        else:
+            waiting_for = values["sn"]
+            def device_ready(devices):
+                return any(d["serial"] == values["sn"] and d["state"] == "device" for d in devices)
+        with tracer.span("wait-for-plug-in"):
+            plugged_in = wait_for_devices(tracker, device_ready, "Plug in {}...".format(waiting_for))
+        if not plugged_in:
+            print("Exiting...")
+            return 0
+        if values["wifi_mode"]:
+            print("Wi-Fi preparation.")
+            if values['addr'] == '':
+                sg.Popup("IP address not specified!")
+                return 1
+            else:
+                try:
+                    port = get_port(values)
+                except ValueError as e:
+                    sg.Popup(str(e))
+                    return 1
+                connected = run_tasks("Launching...", "Connecting to phone...", [[(
+                    "wifi", lambda task: connect_wifi(tools["adb"], values["addr"], port, progress=task.progress))]])
+                if connected is None:
+                    return 1
+
+    print("Running scrcpy command...")
+    serial = target_serial(values)
+
+    def prepare(task):
+        if values["auto_tune"]:
+            task.progress(0, "Measuring the connection to your phone...")
+            apply_auto_tune(values, serial, args.retune)
+        task.progress(50, "Checking your options against your phone...")
+        check_device_options(values, serial, args.retune)
+    if run_tasks("Launching...", "Launching scrcpy...", [[("prepare", prepare)]]) is None:
+        return 1
+    command = build_command(values, tools["scrcpy"])
+    return show_session(values, command, args.max_restarts, serial, policy) #Run scrcpy command and give the exit code scrcpy gives us
+
+
+def main(argv=None):
+    """Run scrcpy-gui.
+
+    Args:
+        argv (list): Command-line arguments. Defaults to sys.argv[1:]
+
+    Returns:
+        int: Exit code to leave scrcpy-gui with
+
+    """
+    global db
+    args = parse_args(argv)
+    if args.trace or args.profile:
+        tracer.open(args.trace or os.path.join(cache_dir(), "trace.jsonl"))
+    if args.profile:
+        atexit.register(tracer.summary)
+    with tracer.span("settings-load"):
+        db = get_db(args.use_profile)
+    policy = resource_policy(args)
+    if args.metrics_port is not None:
+        try:
+            metrics.serve(args.metrics_port)
+        except OSError as e:
+            print("Can't serve metrics on port {}: {}".format(args.metrics_port, e))
+            return 1
+    if args.from_settings:
+        return launch_from_settings(args.use_profile, args.max_restarts, args.retune, policy)
+    if args.screenshot is not None:
+        return screenshots_from_cli(args.screenshot, args.screenshot_dir, args.screenshot_concurrency)
+    if args.scan is not None:
+        return scan_from_cli(args.scan or None, args.scan_port)
+    if args.fleet is not None:
+        return launch_fleet(args.fleet, args.fleet_concurrency, args.fleet_stagger, args.max_restarts, policy)
+    import_gui()
+    return run_gui(args, ensure_installed(args.mirror), policy)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""Tests for the adb server client, against the fake adb server from benchmark.py."""
+
+import socket
+import unittest
+
+import main
+from benchmark import FakeAdbServer
+
+
+class FailingAdbServer(FakeAdbServer):
+    """Fake adb Server Failing Every Request."""
+
+    def _handle(self, conn):
+        with conn:
+            self._read_request(conn)
+            conn.sendall(b"FAIL0010device not found")
+
+
+class AdbClientTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeAdbServer()
+        cls.server.start()
+
+    def setUp(self):
+        self.client = main.AdbClient(port=self.server.port)
+
+    def test_version(self):
+        self.assertEqual(self.client.version(), 0x29)
+
+    def test_devices(self):
+        self.assertEqual(self.client.devices(), [
+            {"serial": "FAKE0001", "state": "device", "usb": "1-1", "product": "fake", "model": "Fake"}])
+
+    def test_connect(self):
+        self.assertEqual(self.client.connect("192.168.1.2:5555"), "connected to 192.168.1.2:5555")
+
+    def test_shell_goes_through_transport(self):
+        self.assertEqual(self.client.shell("echo hi", serial="FAKE0001"), "ran shell:echo hi")
+
+    def test_tcpip(self):
+        self.assertEqual(self.client.tcpip(5555, usb=True), "ran tcpip:5555")
+
+    def test_unknown_request_fails(self):
+        with self.assertRaises(main.CommandExecutionError):
+            self.client.request("host:nothing")
+
+    def test_fail_reply(self):
+        server = FailingAdbServer()
+        server.start()
+        with self.assertRaisesRegex(main.CommandExecutionError, "device not found"):
+            main.AdbClient(port=server.port).shell("echo hi")
+
+    def test_server_not_running(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        with self.assertRaises(OSError):
+            main.AdbClient(port=port, timeout=1).version()
+
+
+class ParseDevicesTest(unittest.TestCase):
+
+    def test_adb_devices_output(self):
+        output = ("List of devices attached\n"
+                  "0123456789ABCDEF       device usb:1-1 product:walleye model:Pixel_2 device:walleye transport_id:1\n"
+                  "192.168.1.2:5555       unauthorized transport_id:2\n"
+                  "\n")
+        self.assertEqual(main.parse_devices(output), [
+            {"serial": "0123456789ABCDEF", "state": "device", "usb": "1-1", "product": "walleye", "model": "Pixel_2",
+             "device": "walleye", "transport_id": "1"},
+            {"serial": "192.168.1.2:5555", "state": "unauthorized", "transport_id": "2"}])
+
+    def test_empty(self):
+        self.assertEqual(main.parse_devices(""), [])
+        self.assertEqual(main.parse_devices("List of devices attached\n\n"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
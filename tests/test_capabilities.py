@@ -0,0 +1,77 @@
+"""Tests for the device capabilities cache, with probing stubbed out."""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import main
+
+
+class DeviceCapabilitiesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.probed = []
+        for name, stub in (("cache_dir", lambda: self.dir), ("probe_capabilities", self.probe)):
+            patcher = mock.patch.object(main, name, stub)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def probe(self, serial):
+        self.probed.append(serial)
+        return {"release": "10", "sdk": 29, "size": [1080, 2340], "refresh_rate": 60.0}
+
+    def capabilities(self, serial, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return main.device_capabilities(serial, **kwargs)
+
+    def test_cached(self):
+        self.assertEqual(self.capabilities("FAKE0001")["size"], [1080, 2340])
+        self.capabilities("FAKE0001")
+        self.assertEqual(self.probed, ["FAKE0001"])
+        self.capabilities("FAKE0001", refresh=True)
+        self.assertEqual(self.probed, ["FAKE0001", "FAKE0001"])
+        self.assertEqual(main.cached_capabilities("FAKE0001")["release"], "10")
+        self.assertIsNone(main.cached_capabilities("FAKE0002"))
+
+    def test_expired(self):
+        self.capabilities("FAKE0001")
+        self.capabilities("FAKE0001", ttl=0)
+        self.assertEqual(self.probed, ["FAKE0001", "FAKE0001"])
+
+    def test_many_threads(self):
+        serials = ["FAKE{:04}".format(i) for i in range(16)]
+        threads = [threading.Thread(target=self.capabilities, args=(serial,)) for serial in serials]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(os.path.join(self.dir, "devices.json")) as f:
+            self.assertEqual(sorted(json.load(f)), serials)
+        self.assertEqual(os.listdir(self.dir), ["devices.json"])
+
+
+class PickSettingsTest(unittest.TestCase):
+
+    def test_framerate_capped_at_refresh_rate(self):
+        capabilities = {"release": "10", "sdk": 29, "size": [1080, 2340], "refresh_rate": 50.0}
+        tuned = main.pick_settings({"rtt": 0.005, "throughput": 40000000}, capabilities)
+        self.assertEqual(tuned["framerate"], "50")
+        values = main.values_from_db({})
+        values.update(tuned, use_resolution=True, use_bitrate=True, use_framerate=True)
+        main.check_options(values, capabilities)  # Doesn't reject what auto-tuning picked
+
+    def test_unknown_display(self):
+        tuned = main.pick_settings({"rtt": 0.005, "throughput": 40000000}, {"size": None, "refresh_rate": None})
+        self.assertEqual((tuned["resolution"], tuned["framerate"]), ("1920", "60"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Tests for downloading and fetching what scrcpy-gui installs, against a local HTTP server and mirror."""
+
+import functools
+import hashlib
+import http.server
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import main
+
+payload = bytes(range(256)) * 1024
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves payload at every path, with Range support."""
+
+    ranges = []
+
+    def do_GET(self):
+        RangeHandler.ranges.append(self.headers.get("Range"))
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+            if start >= len(payload):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(payload) - 1, len(payload)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.end_headers()
+        self.wfile.write(payload[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietFileHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves files without logging every request."""
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadFileTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = "http://127.0.0.1:{}/scrcpy.zip".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        RangeHandler.ranges = []
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.dest = os.path.join(self.dir, "scrcpy.zip")
+
+    def read_dest(self):
+        with open(self.dest, "rb") as f:
+            return f.read()
+
+    def test_download(self):
+        seen = []
+        main.download_file(self.url, self.dest, hashlib.sha256(payload).hexdigest(), lambda done, total: seen.append((done, total)))
+        self.assertEqual(self.read_dest(), payload)
+        self.assertEqual(seen[-1], (len(payload), len(payload)))
+        self.assertFalse(os.path.exists(self.dest + ".part"))
+
+    def test_resume(self):
+        with open(self.dest + ".part", "wb") as f:
+            f.write(payload[:1000])
+        main.download_file(self.url, self.dest, hashlib.sha256(payload).hexdigest())
+        self.assertEqual(RangeHandler.ranges, ["bytes=1000-"])
+        self.assertEqual(self.read_dest(), payload)
+
+    def test_complete_part_file(self):
+        with open(self.dest + ".part", "wb") as f:
+            f.write(payload)
+        main.download_file(self.url, self.dest, hashlib.sha256(payload).hexdigest())  # Server answers 416
+        self.assertEqual(self.read_dest(), payload)
+
+    def test_checksum_mismatch(self):
+        with self.assertRaisesRegex(main.CommandExecutionError, "Checksum mismatch"):
+            main.download_file(self.url, self.dest, "0" * 64)
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(self.dest + ".part"))
+
+    def test_server_error(self):
+        with self.assertRaises(main.CommandExecutionError):
+            main.download_file("http://127.0.0.1:1/scrcpy.zip", self.dest)
+
+
+class MirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.cache = os.path.join(self.dir, "cache")
+        self.mirror = os.path.join(self.dir, "mirror")
+        os.makedirs(self.mirror)
+
+    def test_fetch_artifact(self):
+        with open(os.path.join(self.mirror, "scrcpy-server-v1.14"), "wb") as f:
+            f.write(payload)
+        path = main.fetch_artifact("scrcpy-server-v1.14", "http://127.0.0.1:1/unused", self.cache, self.mirror)
+        self.assertEqual(os.path.basename(path), hashlib.sha256(payload).hexdigest())
+        os.remove(os.path.join(self.mirror, "scrcpy-server-v1.14"))
+        # Cached by now, so the mirror isn't needed anymore
+        self.assertEqual(main.fetch_artifact("scrcpy-server-v1.14", "http://127.0.0.1:1/unused", self.cache, self.mirror), path)
+
+    def test_fetch_artifact_checksum_mismatch(self):
+        with open(os.path.join(self.mirror, "scrcpy-server-v1.14"), "wb") as f:
+            f.write(payload)
+        with self.assertRaisesRegex(main.CommandExecutionError, "Checksum mismatch"):
+            main.fetch_artifact("scrcpy-server-v1.14", "http://127.0.0.1:1/unused", self.cache, self.mirror, "0" * 64)
+
+    def test_fetch_artifact_missing(self):
+        with self.assertRaises(main.CommandExecutionError):
+            main.fetch_artifact("scrcpy-server-v1.14", "http://127.0.0.1:1/unused", self.cache, self.mirror)
+
+    def test_fetch_source_folder(self):
+        os.makedirs(os.path.join(self.mirror, "scrcpy-v1.14"))
+        with open(os.path.join(self.mirror, "scrcpy-v1.14", "meson.build"), "w") as f:
+            f.write("project('scrcpy')\n")
+        src = main.fetch_source("v1.14", self.cache, self.mirror)
+        self.assertTrue(os.path.isfile(os.path.join(src, "meson.build")))
+        shutil.rmtree(os.path.join(self.mirror, "scrcpy-v1.14"))
+        self.assertEqual(main.fetch_source("v1.14", self.cache, self.mirror), src)
+
+    def test_fetch_source_tarball(self):
+        tree = os.path.join(self.dir, "scrcpy-1.14")
+        os.makedirs(tree)
+        with open(os.path.join(tree, "meson.build"), "w") as f:
+            f.write("project('scrcpy')\n")
+        with tarfile.open(os.path.join(self.mirror, "scrcpy-v1.14.tar.gz"), "w:gz") as tar:
+            tar.add(tree, "scrcpy-1.14")
+        src = main.fetch_source("v1.14", self.cache, self.mirror)
+        self.assertEqual(src, os.path.join(self.cache, "src", "scrcpy-v1.14"))
+        self.assertTrue(os.path.isfile(os.path.join(src, "meson.build")))
+
+    def test_fetch_source_download(self):
+        tree = os.path.join(self.dir, "scrcpy-1.14")
+        os.makedirs(tree)
+        with open(os.path.join(tree, "meson.build"), "w") as f:
+            f.write("project('scrcpy')\n")
+        with tarfile.open(os.path.join(self.mirror, "v1.14.tar.gz"), "w:gz") as tar:
+            tar.add(tree, "scrcpy-1.14")
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietFileHandler, directory=self.mirror))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = "http://127.0.0.1:{}/{{0}}.tar.gz".format(server.server_address[1])
+        with mock.patch.object(main, "scrcpy_source_url", url):
+            src = main.fetch_source("v1.14", self.cache)
+        self.assertTrue(os.path.isfile(os.path.join(src, "meson.build")))
+        self.assertEqual(os.listdir(os.path.join(self.cache, "src")), ["scrcpy-v1.14"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Tests for the settings profile store."""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import main
+
+
+class ProfileStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = os.path.join(self.dir, "scrcpy-gui-settings.json")
+
+    def write(self, data):
+        with open(self.path, "w") as f:
+            json.dump(data, f)
+
+    def read(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def load(self):
+        store = main.ProfileStore(self.path, delay=60)
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.load()
+        self.addCleanup(store.flush)
+        return store
+
+    def test_missing_file(self):
+        store = self.load()
+        self.assertEqual(store.names(), [])
+        self.assertEqual(store.profile_for_device("FAKE0001"), "default")
+
+    def test_migrates_flat_settings(self):
+        self.write({"bitrate": "8M", "is_usb": True})
+        store = self.load()
+        self.assertEqual(store.names(), ["default"])
+        self.assertEqual(store.get("default"), {"bitrate": "8M", "is_usb": True})
+
+    def test_put_and_flush(self):
+        store = self.load()
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.put("work", {"bitrate": "4M"}, "FAKE0001")
+            store.flush()
+        data = self.read()
+        self.assertEqual(data["profiles"], {"work": {"bitrate": "4M"}})
+        self.assertEqual(data["device_profiles"], {"FAKE0001": "work"})
+        self.assertEqual(data["last_profile"], "work")
+        self.assertEqual(self.load().profile_for_device("FAKE0001"), "work")
+
+    def test_merges_other_instances(self):
+        first = self.load()
+        second = self.load()
+        with contextlib.redirect_stdout(io.StringIO()):
+            first.put("home", {"bitrate": "8M"}, "FAKE0001")
+            first.flush()
+            second.put("work", {"bitrate": "4M"}, "FAKE0002")
+            second.flush()
+        data = self.read()
+        self.assertEqual(data["profiles"], {"home": {"bitrate": "8M"}, "work": {"bitrate": "4M"}})
+        self.assertEqual(data["device_profiles"], {"FAKE0001": "home", "FAKE0002": "work"})
+        self.assertEqual(data["last_profile"], "work")
+
+    def test_relative_path_survives_chdir(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self.dir)
+        store = main.ProfileStore("scrcpy-gui-settings.json")
+        os.chdir(tempfile.gettempdir())
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.put("work", {"bitrate": "4M"})
+            store.flush()
+        self.assertEqual(self.read()["profiles"], {"work": {"bitrate": "4M"}})
+
+    def test_coalesces_writes(self):
+        store = self.load()
+        store.put("work", {"bitrate": "4M"})
+        store.put("work", {"bitrate": "2M"})
+        self.assertFalse(os.path.exists(self.path))  # Nothing written until the delay is up or flush()
+        with contextlib.redirect_stdout(io.StringIO()):
+            store.flush()
+        self.assertEqual(self.read()["profiles"], {"work": {"bitrate": "2M"}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Tests for segmented recording, with a fake ffmpeg standing in through SCRCPY_GUI_FFMPEG."""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import main
+
+# Cuts whatever comes through the pipe into 10 byte "segments", listing each one as it's finished
+# like ffmpeg's segment muxer does, or copies the input to the output when post-processing.
+fake_ffmpeg = """#!{python}
+import shutil, sys
+args = sys.argv[1:]
+with open({log!r}, "a") as log:
+    log.write(" ".join(args) + "\\n")
+if "-segment_list" in args:
+    list_file = args[args.index("-segment_list") + 1]
+    with open(args[args.index("-i") + 1], "rb") as pipe, open(list_file, "w") as listing:
+        number = 0
+        for chunk in iter(lambda: pipe.read(10), b""):
+            name = args[-1] % number
+            with open(name, "wb") as f:
+                f.write(chunk)
+            listing.write("{{}},{{:.1f}},{{:.1f}}\\n".format(name.replace("\\\\", "/").split("/")[-1], number, number + 1.0))
+            listing.flush()
+            number += 1
+else:
+    shutil.copyfile(args[args.index("-i") + 1], args[-1])
+"""
+
+
+@unittest.skipUnless(hasattr(os, "mkfifo"), "needs named pipes")
+class SegmentRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.recordings = os.path.join(self.dir, "recordings")
+        self.log = os.path.join(self.dir, "ffmpeg.log")
+        ffmpeg = os.path.join(self.dir, "ffmpeg")
+        with open(ffmpeg, "w") as f:
+            f.write(fake_ffmpeg.format(python=sys.executable, log=self.log))
+        os.chmod(ffmpeg, 0o755)
+        patcher = mock.patch.dict(os.environ, {"SCRCPY_GUI_FFMPEG": ffmpeg})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, recorder, runs):
+        """Feed each run's data through the pipe like scrcpy would, restarting in between."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            recorder.start()
+            for i, data in enumerate(runs):
+                deadline = time.monotonic() + 10
+                while len(recorder._list_files) <= i and time.monotonic() < deadline:  # ffmpeg restarted
+                    time.sleep(0.01)
+                with open(recorder.pipe, "wb") as pipe:
+                    pipe.write(data)
+            recorder.stop()
+
+    def index(self):
+        with open(os.path.join(self.recordings, "index.jsonl")) as f:
+            return [json.loads(line) for line in f]
+
+    def test_segments_from_every_run(self):
+        recorder = main.SegmentRecorder(self.recordings, segment_seconds=1)
+        self.assertEqual(recorder.ffmpeg, os.environ["SCRCPY_GUI_FFMPEG"])
+        self.record(recorder, [b"a" * 30, b"b" * 20])
+        names = ["{}-{:03d}-{:05d}.mp4".format(recorder.prefix, run, number) for run, number in ((0, 0), (0, 1), (0, 2), (1, 0), (1, 1))]
+        self.assertEqual(sorted(entry["file"] for entry in self.index()), names)
+        self.assertEqual({entry["bytes"] for entry in self.index()}, {10})
+        self.assertEqual(sorted(os.listdir(self.recordings)), sorted(names + ["index.jsonl"]))  # Pipe and lists cleaned up
+        with open(os.path.join(self.recordings, names[3]), "rb") as f:
+            self.assertEqual(f.read(), b"b" * 10)
+
+    def test_retention_counts_earlier_recordings(self):
+        os.makedirs(self.recordings)
+        old = os.path.join(self.recordings, "scrcpy-20200101-000000.mp4")
+        with open(old, "wb") as f:
+            f.write(b"o" * 100)
+        recorder = main.SegmentRecorder(self.recordings, segment_seconds=1, max_bytes=45)
+        self.record(recorder, [b"a" * 30, b"b" * 20])
+        self.assertFalse(os.path.exists(old))
+        kept = sorted(name for name in os.listdir(self.recordings) if name.endswith(".mp4"))
+        self.assertEqual(kept, ["{}-{:03d}-{:05d}.mp4".format(recorder.prefix, run, number) for run, number in ((0, 1), (0, 2), (1, 0), (1, 1))])
+
+    def test_compress(self):
+        recorder = main.SegmentRecorder(self.recordings, compress=True)
+        self.record(recorder, [b"a" * 10])
+        with open(self.log) as f:
+            remuxes = [line for line in f if "-segment_list" not in line]
+        self.assertEqual(len(remuxes), 1)
+        self.assertIn("-c:v libx264", remuxes[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Tests for scanning for adb devices, against fake adbd listeners on 127.0.0.1."""
+
+import socket
+import struct
+import threading
+import unittest
+
+import main
+
+
+class FakeAdbd(threading.Thread):
+    """Fake adbd Listener.
+
+    Answers the CNXN message every adb connection starts with by sending reply back.
+
+    """
+
+    def __init__(self, reply):
+        super().__init__(daemon=True)
+        self.reply = reply
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+
+    def run(self):
+        while True:
+            conn, _ = self.sock.accept()
+            with conn:
+                header = b""
+                while len(header) < 24:
+                    header += conn.recv(24 - len(header))
+                length = struct.unpack("<6I", header)[3]
+                while length > 0:
+                    length -= len(conn.recv(length))
+                conn.sendall(self.reply)
+
+
+class ScanNetworkTest(unittest.TestCase):
+
+    def scan(self, reply):
+        adbd = FakeAdbd(reply)
+        adbd.start()
+        seen = []
+        found = main.scan_network("127.0.0.0/24", adbd.port, timeout=1, progress=lambda done, total: seen.append((done, total)))
+        self.assertEqual(seen[-1], (254, 254))
+        return found, adbd.port
+
+    def test_device(self):
+        reply = main.adb_message(b"CNXN", main.adb_version, main.adb_max_data, b"device::ro.product.name=walleye;ro.product.model=Pixel 2;\0")
+        found, port = self.scan(reply)
+        self.assertEqual(found, [{"addr": "127.0.0.1", "port": port, "state": "device", "model": "Pixel 2"}])
+
+    def test_unauthorized(self):
+        found, port = self.scan(main.adb_message(b"AUTH", 1, 0, b"x" * 20))
+        self.assertEqual(found, [{"addr": "127.0.0.1", "port": port, "state": "unauthorized", "model": ""}])
+
+    def test_not_adb(self):
+        found, _ = self.scan(b"HTTP/1.0 400 Bad Request\r\n\r\n")
+        self.assertEqual(found, [])
+
+    def test_bad_network(self):
+        with self.assertRaises(ValueError):
+            main.scan_network("not a network")
+
+
+if __name__ == "__main__":
+    unittest.main()
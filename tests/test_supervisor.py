@@ -0,0 +1,105 @@
+"""Tests for the scrcpy supervisor, with small Python scripts standing in for scrcpy."""
+
+import contextlib
+import io
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import main
+
+
+def script(source):
+    return [sys.executable, "-c", source]
+
+
+class ScrcpySupervisorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.lines = []
+
+    def supervise(self, command, **kwargs):
+        return main.ScrcpySupervisor(command, on_line=lambda stream, line: self.lines.append((stream, line)), **kwargs)
+
+    def run_quietly(self, supervisor):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return supervisor.run()
+
+    def test_clean_exit_isnt_restarted(self):
+        supervisor = self.supervise(script("print('INFO: Renderer: opengl')"))
+        self.assertEqual(self.run_quietly(supervisor), 0)
+        self.assertEqual(supervisor.restarts, 0)
+        self.assertEqual(self.lines, [("stdout", "INFO: Renderer: opengl")])
+
+    def test_crash_is_restarted(self):
+        counter = os.path.join(self.dir, "runs")
+        # Crashes the first time, then exits cleanly
+        supervisor = self.supervise(script(
+            "import os, sys\n"
+            "first = not os.path.exists({0!r})\n"
+            "open({0!r}, 'a').close()\n"
+            "sys.exit(2 if first else 0)".format(counter)))
+        self.assertEqual(self.run_quietly(supervisor), 0)
+        self.assertEqual(supervisor.restarts, 1)
+
+    def test_gives_up_after_max_restarts(self):
+        supervisor = self.supervise(script("import sys; sys.exit(3)"), max_restarts=2)
+        self.assertEqual(self.run_quietly(supervisor), 3)
+        self.assertEqual(supervisor.restarts, 2)
+
+    def test_before_restart_can_give_up(self):
+        asked = []
+        supervisor = self.supervise(script("import sys; sys.exit(4)"), before_restart=lambda: asked.append(True) and False)
+        self.assertEqual(self.run_quietly(supervisor), 4)
+        self.assertEqual((len(asked), supervisor.restarts), (1, 0))
+
+    @unittest.skipIf(os.name == "nt", "needs POSIX signals")
+    def test_stop(self):
+        supervisor = self.supervise(script("import time; print('ready', flush=True); time.sleep(30)"))
+        threading.Thread(target=self.stop_when_ready, args=(supervisor, supervisor.stop), daemon=True).start()
+        self.assertEqual(self.run_quietly(supervisor), 128 + signal.SIGTERM)
+        self.assertEqual(supervisor.restarts, 0)
+
+    @unittest.skipIf(os.name == "nt", "needs POSIX signals")
+    def test_restart(self):
+        supervisor = self.supervise(script("import time; print('ready', flush=True); time.sleep(30)"))
+
+        def restart_then_stop():
+            self.stop_when_ready(supervisor, supervisor.restart)
+            self.stop_when_ready(supervisor, supervisor.stop, 2)
+        threading.Thread(target=restart_then_stop, daemon=True).start()
+        self.assertEqual(self.run_quietly(supervisor), 128 + signal.SIGTERM)
+        self.assertEqual(supervisor.restarts, 1)
+
+    @unittest.skipIf(os.name == "nt", "needs POSIX signals")
+    def test_restart_even_after_clean_exit(self):
+        # Quits cleanly on SIGTERM like scrcpy does, which restart() mustn't take for the user closing it
+        supervisor = self.supervise(script(
+            "import signal, sys, time\n"
+            "signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))\n"
+            "print('ready', flush=True)\n"
+            "time.sleep(30)"))
+
+        def restart_then_stop():
+            self.stop_when_ready(supervisor, supervisor.restart)
+            self.stop_when_ready(supervisor, supervisor.stop, 2)
+        threading.Thread(target=restart_then_stop, daemon=True).start()
+        self.assertEqual(self.run_quietly(supervisor), 0)
+        self.assertEqual(supervisor.restarts, 1)
+
+    def stop_when_ready(self, supervisor, action, runs=1):
+        deadline = time.monotonic() + 10
+        while self.lines.count(("stdout", "ready")) < runs and time.monotonic() < deadline:
+            time.sleep(0.01)
+        action()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Tests for auto-tuning, with the link and device probes stubbed out."""
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import main
+
+
+class AutoTuneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.probed = []
+        capabilities = {"release": "10", "sdk": 29, "size": [1080, 2340], "refresh_rate": 60.0}
+        for name, stub in (("cache_dir", lambda: self.dir), ("probe_link", self.probe),
+                           ("probe_capabilities", lambda serial: capabilities)):
+            patcher = mock.patch.object(main, name, stub)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def probe(self, serial):
+        self.probed.append(serial)
+        return {"rtt": 0.005, "throughput": 40000000}
+
+    def tune(self, serial, retune=False):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return main.auto_tune(serial, retune)
+
+    def test_cached(self):
+        self.assertEqual(self.tune("FAKE0001"), {"bitrate": "16M", "resolution": "1920", "framerate": "60"})
+        self.tune("FAKE0001")
+        self.assertEqual(self.probed, ["FAKE0001"])
+        self.tune("FAKE0001", retune=True)
+        self.assertEqual(self.probed, ["FAKE0001", "FAKE0001"])
+
+    def test_cached_per_link_type(self):
+        self.tune("FAKE0001")
+        self.tune("192.168.1.2:5555")
+        self.assertEqual(self.probed, ["FAKE0001", "192.168.1.2:5555"])
+
+    def test_many_threads(self):
+        serials = ["FAKE{:04}".format(i) for i in range(16)]
+        threads = [threading.Thread(target=self.tune, args=(serial,)) for serial in serials]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(os.path.join(self.dir, "tuning.json")) as f:
+            self.assertEqual(sorted(json.load(f)), [serial + "|usb" for serial in serials])
+
+
+if __name__ == "__main__":
+    unittest.main()